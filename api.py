@@ -0,0 +1,195 @@
+import io
+import os
+import json
+import time
+import traceback
+from flask import Flask, Response, request, jsonify, send_file, url_for, stream_with_context
+from flask_cors import CORS
+from jobs import create_job_backend
+from progress import PROGRESS
+from metrics import REGISTRY
+
+# --- HTTP API ---
+# POST /jobs                       multipart "file" (or a raw PDF body) + settings -> 202 {job_id}
+# GET  /jobs/<id>                  status: queued | running | done | failed
+# GET  /jobs/<id>/json[?lang=EN]   extracted and localized record(s)
+# GET  /jobs/<id>/report/<lang>    the DOCX
+# GET  /jobs/<id>/events           progress as server-sent events (text/event-stream)
+# GET  /metrics                    Prometheus text format (see metrics.py)
+#
+# Requests only enqueue and read jobs; extraction, translation and rendering run on the
+# job backend's workers. With JOB_BACKEND=memory (default) serve with a single process
+# (gunicorn -w 1 --threads 8 api:app); JOB_BACKEND=sqlite lets several processes share jobs.
+
+API_MAX_UPLOAD_BYTES = int(os.getenv("API_MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_POLL_SECONDS = float(os.getenv("SSE_POLL_SECONDS", "1"))
+REPORT_LANGS = ("PT", "EN")
+LANGUAGE_SKILL_KEYS = ("english", "spanish", "japanese")
+DOCX_MIMETYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+app = Flask(__name__)
+app.config["MAX_CONTENT_LENGTH"] = API_MAX_UPLOAD_BYTES
+CORS(app)
+
+JOBS = create_job_backend()
+
+def error_response(message, status):
+    return jsonify({"error": message}), status
+
+def parse_report_langs(value):
+    value = (value or "PT").upper().replace("+", ",")
+    langs = []
+    for lang in value.split(","):
+        lang = lang.strip()
+        if lang and lang not in langs:
+            langs.append(lang)
+    unknown = [lang for lang in langs if lang not in REPORT_LANGS]
+    if unknown or not langs:
+        raise ValueError(f"report_lang must be PT, EN or PT + EN, got {value!r}")
+    return langs
+
+def read_job_request():
+    upload = request.files.get("file")
+    if upload is not None:
+        file_bytes = upload.read()
+    elif request.mimetype == "application/pdf":
+        file_bytes = request.get_data()
+    else:
+        raise ValueError("Send the CV as a multipart 'file' field or as an application/pdf body")
+    if not file_bytes.startswith(b"%PDF"):
+        raise ValueError("Not a PDF file")
+
+    fields = request.form if request.form else request.args
+    company = fields.get("company", "").strip()
+    company_title = fields.get("company_title", "").strip()
+    if not company or not company_title:
+        raise ValueError("company and company_title are required")
+    settings = {
+        "report_langs": parse_report_langs(fields.get("report_lang")),
+        "company": company,
+        "company_title": company_title,
+        "language_skills": {key: fields[key] for key in LANGUAGE_SKILL_KEYS if fields.get(key)},
+    }
+    return file_bytes, settings
+
+@app.post("/jobs")
+def create_job():
+    try:
+        file_bytes, settings = read_job_request()
+    except ValueError as e:
+        return error_response(str(e), 400)
+    try:
+        job_id = JOBS.submit(file_bytes, settings)
+    except Exception as e:
+        traceback.print_exc()
+        return error_response(str(e), 503)
+    status_url = url_for("job_status", job_id=job_id)
+    return jsonify({"job_id": job_id, "status": "queued", "status_url": status_url}), 202, {"Location": status_url}
+
+@app.get("/jobs/<job_id>")
+def job_status(job_id):
+    status = JOBS.status(job_id)
+    if status is None:
+        return error_response("Job not found", 404)
+    if status["status"] == "done":
+        status["json_url"] = url_for("job_json", job_id=job_id)
+        status["report_urls"] = {
+            lang: url_for("job_report", job_id=job_id, lang=lang) for lang in status["report_langs"]
+        }
+    return jsonify(status)
+
+def finished_job(job_id):
+    # Returns (status, None) when the job's output can be read, else (None, error response)
+    status = JOBS.status(job_id)
+    if status is None:
+        return None, error_response("Job not found", 404)
+    if status["status"] == "failed":
+        return None, error_response(status.get("error") or "Job failed", 422)
+    if status["status"] != "done":
+        return None, error_response(f"Job is {status['status']}", 409)
+    return status, None
+
+@app.get("/jobs/<job_id>/json")
+def job_json(job_id):
+    status, error = finished_job(job_id)
+    if error:
+        return error
+    results = JOBS.result(job_id) or {}
+    lang = request.args.get("lang", "").upper()
+    if not lang:
+        return jsonify(results)
+    if lang not in results:
+        return error_response(f"No {lang} result for this job", 404)
+    return jsonify(results[lang])
+
+@app.get("/jobs/<job_id>/report/<lang>")
+def job_report(job_id, lang):
+    status, error = finished_job(job_id)
+    if error:
+        return error
+    report = JOBS.report(job_id, lang)
+    if report is None:
+        return error_response(f"No {lang.upper()} report for this job", 404)
+    filename, data = report
+    return send_file(io.BytesIO(data), mimetype=DOCX_MIMETYPE, as_attachment=True, download_name=filename)
+
+# --- Progress stream ---
+# Live stage/translation/token events come from the job's channel, which only exists in the
+# process running the job, once a worker has started it. Until then, and in any other
+# process (JOB_BACKEND=sqlite with several workers), status changes are polled from the
+# backend; the stream switches to the live channel if it shows up in this process.
+
+def sse_message(event):
+    return f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+def channel_events(channel):
+    for event in channel.listen(heartbeat=SSE_HEARTBEAT_SECONDS):
+        yield sse_message(event) if event is not None else ": keep-alive\n\n"
+
+def polled_status_events(job_id):
+    last_status, last_sent = None, time.monotonic()
+    while True:
+        channel = PROGRESS.get(job_id)
+        if channel is not None:
+            yield from channel_events(channel)
+            return
+        status = JOBS.status(job_id)
+        if status is None:
+            return
+        if status["status"] != last_status:
+            last_status, last_sent = status["status"], time.monotonic()
+            yield sse_message({"event": "job", "status": status["status"], "error": status.get("error"), "at": status["updated_at"]})
+            if last_status in ("done", "failed"):
+                return
+        elif time.monotonic() - last_sent >= SSE_HEARTBEAT_SECONDS:
+            last_sent = time.monotonic()
+            yield ": keep-alive\n\n"
+        time.sleep(SSE_POLL_SECONDS)
+
+@app.get("/jobs/<job_id>/events")
+def job_events(job_id):
+    if JOBS.status(job_id) is None:
+        return error_response("Job not found", 404)
+    channel = PROGRESS.get(job_id)
+    events = channel_events(channel) if channel is not None else polled_status_events(job_id)
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/health")
+def health():
+    return jsonify({"status": "ok"})
+
+@app.get("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+@app.errorhandler(413)
+def upload_too_large(_):
+    return error_response(f"Upload exceeds {API_MAX_UPLOAD_BYTES} bytes", 413)
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", "8000")))
@@ -0,0 +1,185 @@
+import io
+import os
+import json
+import time
+import zipfile
+import tempfile
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pdf_text import get_pdf_pool, reset_pdf_pool, extract_pdf_text_with_stats
+import unified_report_generator as generator
+
+# --- Batch report generation ---
+# A zip (or list) of CVs with shared settings becomes one zip of reports plus a
+# manifest.json with a status line per input file. PDF text is extracted on the process
+# pool; LLM extraction, translation and rendering run on BATCH_CONCURRENCY threads, and
+# every OpenAI request goes through the process-wide rate limiter
+# (OPENAI_REQUESTS_PER_MINUTE), so throughput follows configuration, not click rate.
+#
+# The output zip is written to a temporary file that stays in memory only up to
+# BATCH_ZIP_MEMORY_BYTES; a full batch is hundreds of MB of DOCX, stored uncompressed in
+# the zip since DOCX files are zips already.
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "200"))
+BATCH_MAX_FILE_BYTES = int(os.getenv("BATCH_MAX_FILE_BYTES", str(20 * 1024 * 1024)))
+BATCH_ZIP_MEMORY_BYTES = int(os.getenv("BATCH_ZIP_MEMORY_BYTES", str(32 * 1024 * 1024)))
+
+def is_pdf_name(name):
+    base = os.path.basename(name)
+    return name.lower().endswith(".pdf") and not base.startswith(".") and "__MACOSX/" not in name
+
+def read_zip_inputs(zip_source):
+    files = []
+    with zipfile.ZipFile(zip_source) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not is_pdf_name(info.filename):
+                continue
+            if info.file_size > BATCH_MAX_FILE_BYTES:
+                files.append((info.filename, None))  # reported as an error in the manifest
+                continue
+            files.append((info.filename, archive.read(info)))
+    return files
+
+def read_batch_inputs(source):
+    # Accepts zip bytes, a path to a zip or a folder, or a list of (name, bytes) pairs;
+    # zips inside the list are expanded
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        files = read_zip_inputs(io.BytesIO(bytes(source)))
+    elif isinstance(source, str) and os.path.isdir(source):
+        files = []
+        for root, _, names in os.walk(source):
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                if is_pdf_name(path):
+                    files.append((os.path.relpath(path, source), generator.read_cv_file(path)))
+    elif isinstance(source, str) and is_pdf_name(source):
+        files = [(os.path.basename(source), generator.read_cv_file(source))]
+    elif isinstance(source, str):
+        files = read_zip_inputs(source)
+    else:
+        files = []
+        for name, data in source:
+            data = bytes(data)
+            if name.lower().endswith(".zip"):
+                files.extend(read_zip_inputs(io.BytesIO(data)))
+            else:
+                files.append((name, data))
+    if len(files) > BATCH_MAX_FILES:
+        raise ValueError(f"Batch has {len(files)} files; the limit is {BATCH_MAX_FILES}")
+    return files
+
+def unique_name(name, used):
+    stem, ext = os.path.splitext(name)
+    candidate, n = name, 2
+    while candidate in used:
+        candidate = f"{stem}_{n}{ext}"
+        n += 1
+    used.add(candidate)
+    return candidate
+
+def process_batch_file(name, file_bytes, text_future, settings, cached=False):
+    started = time.monotonic()
+    entry = {"file": name, "status": "error", "reports": []}
+    try:
+        if file_bytes is None:
+            entry["error"] = "File too large"
+            return entry, []
+        if not file_bytes.startswith(b"%PDF"):
+            entry["error"] = "Not a PDF file"
+            return entry, []
+        entry["cached"] = cached
+        extraction_stats = {}
+        cv_text = None
+        if text_future is not None:
+            try:
+                cv_text, pdf_stats = text_future.result()
+                extraction_stats.update(pdf_stats)
+            except BrokenProcessPool:
+                traceback.print_exc()  # worker died: extract this PDF in-thread instead
+        translation_stats = generator.new_translation_stats()
+        output = generator.generate_reports(file_bytes, settings, extraction_stats, translation_stats, cv_text)
+        if "error" in output:
+            entry["error"] = output["error"]
+            return entry, []
+
+        reports = [(filename, report) for _, filename, report in output["reports"]]
+        entry.update({
+            "status": "ok",
+            "candidate": output["results"][settings["report_langs"][0]].get("cdd_name", ""),
+            "translations_sent_to_llm": translation_stats["sent_to_llm"]
+        })
+        if "usage_prompt_tokens" in extraction_stats:
+            entry["prompt_tokens"] = extraction_stats["usage_prompt_tokens"]
+            entry["completion_tokens"] = extraction_stats["usage_completion_tokens"]
+        return entry, reports
+    except Exception as e:
+        traceback.print_exc()
+        entry["error"] = str(e)
+        return entry, []
+    finally:
+        entry["seconds"] = round(time.monotonic() - started, 2)
+
+def run_batch(files, report_langs, company="", company_title="", language_skills=None, concurrency=None, on_progress=None):
+    settings = {
+        "report_langs": [lang.upper() for lang in report_langs],
+        "company": company,
+        "company_title": company_title,
+        "language_skills": language_skills,
+    }
+    # One cache lookup per file, shared by the pool queueing below and the manifest
+    cached = [
+        bool(file_bytes) and file_bytes.startswith(b"%PDF") and generator.is_extraction_cached(file_bytes)
+        for _, file_bytes in files
+    ]
+    # PDF parsing is CPU-bound: queue every uncached PDF on the process pool up front so
+    # text is ready by the time an LLM worker picks the file up
+    text_futures = {}
+    pool = None
+    try:
+        pool = get_pdf_pool()
+        for index, (_, file_bytes) in enumerate(files):
+            if file_bytes and file_bytes.startswith(b"%PDF") and not cached[index]:
+                text_futures[index] = pool.submit(extract_pdf_text_with_stats, file_bytes)
+    except Exception as e:
+        # No usable process pool on this host: the remaining PDFs are extracted in-thread
+        traceback.print_exc()
+        if isinstance(e, BrokenProcessPool):
+            reset_pdf_pool(pool)
+
+    manifest = [None] * len(files)
+    used_names = {"manifest.json"}
+    # Returned open and rewound; the caller reads it and closes it
+    output = tempfile.SpooledTemporaryFile(max_size=BATCH_ZIP_MEMORY_BYTES, suffix=".zip")
+    try:
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive, \
+                ThreadPoolExecutor(max_workers=concurrency or BATCH_CONCURRENCY) as workers:
+            futures = {
+                workers.submit(process_batch_file, name, file_bytes, text_futures.get(index), settings, cached[index]): index
+                for index, (name, file_bytes) in enumerate(files)
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                index = futures[future]
+                entry, reports = future.result()
+                for filename, report in reports:
+                    filename = unique_name(filename, used_names)
+                    archive.writestr(filename, report, compress_type=zipfile.ZIP_STORED)
+                    entry["reports"].append(filename)
+                manifest[index] = entry
+                if on_progress is not None:
+                    on_progress(done, len(files), entry)
+            summary = {
+                "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "settings": {k: v for k, v in settings.items() if k != "language_skills"},
+                "total": len(files),
+                "ok": sum(1 for e in manifest if e["status"] == "ok"),
+                "failed": sum(1 for e in manifest if e["status"] != "ok"),
+                "files": manifest,
+            }
+            archive.writestr("manifest.json", json.dumps(summary, ensure_ascii=False, indent=2))
+    except BaseException:
+        output.close()
+        raise
+    output.seek(0)
+    return output, summary
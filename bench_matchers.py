@@ -0,0 +1,81 @@
+import sys
+import random
+import timeit
+import unified_report_generator as u
+
+# --- Microbenchmark: memoized level/present-term matching vs. the plain loops ---
+# Usage: python bench_matchers.py [iterations]
+# The plain loops are the memoized functions' __wrapped__ originals. Two scenarios:
+# - repeated inputs: a few dozen words recombined, so after the first pass nearly every
+#   call is an LRU memo hit.
+# - unique inputs: every string is distinct, so every call misses the memo and pays for
+#   the loop plus the cache bookkeeping.
+
+def loop_canonicalize_language_level(raw_level, report_lang):
+    if not isinstance(raw_level, str):
+        return ""
+    lang_key = "pt" if report_lang.upper() == "PT" else "en"
+    return u._canonical_level.__wrapped__(raw_level.strip().lower(), lang_key)
+
+def loop_is_present_term_any(end_str, report_lang):
+    if not isinstance(end_str, str):
+        return False
+    return u._contains_present_term.__wrapped__(end_str.strip().lower())
+
+def level_corpus(rng, size):
+    words = [p for lvl in u.CANONICAL_LANGUAGE_LEVELS for p in lvl["matches"]]
+    words += [lvl[k] for lvl in u.CANONICAL_LANGUAGE_LEVELS for k in ("pt", "en")]
+    words += ["b2", "c1", "conversação", "leitura", "writing", "good", "bom", "nível", "level", ""]
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(1, 3))) for _ in range(size)]
+
+def date_corpus(rng, size):
+    words = u.PRESENT_TERMS_PT + u.PRESENT_TERMS_EN
+    words += ["03/2019", "12/2021", "jan 2020", "março 2018", "2017", "until", "até", "n/a", ""]
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(1, 2))) for _ in range(size)]
+
+def unique_corpus(rng, corpus):
+    # Same shapes plus a distinct free-text tail, as real CV fields rarely repeat exactly
+    letters = "bcdfghjklmnpqrstvwxz"
+    tails = ["certificado", "curso", "empresa", "projeto", "certificate", "course", "company", "project"]
+    unique = []
+    for i, text in enumerate(corpus):
+        tag = "".join(letters[int(d)] for d in str(i))
+        unique.append(f"{text} - {rng.choice(tails)} {tag}")
+    return unique
+
+def check(name, old, new, corpus):
+    for lang in ("PT", "EN"):
+        for text in corpus:
+            if old(text, lang) != new(text, lang):
+                raise SystemExit(f"{name} mismatch for {text!r} ({lang}): {old(text, lang)!r} != {new(text, lang)!r}")
+
+def time_it(fn, corpus, iterations, clear=None):
+    def run():
+        if clear is not None:
+            clear()  # keep every input a miss, whatever earlier rounds cached
+        for text in corpus:
+            for lang in ("PT", "EN"):
+                fn(text, lang)
+    return min(timeit.repeat(run, number=iterations, repeat=5))
+
+def report(name, scenario, old, new, corpus, iterations, clear=None):
+    check(name, old, new, corpus)
+    old_time = time_it(old, corpus, iterations)
+    new_time = time_it(new, corpus, iterations, clear)
+    calls = len(corpus) * 2 * iterations
+    print(f"{name} [{scenario}]: loop {old_time / calls * 1e6:.2f} us/call, memoized {new_time / calls * 1e6:.2f} us/call, {old_time / new_time:.1f}x")
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rng = random.Random(7)
+    cases = [
+        ("canonicalize_language_level", loop_canonicalize_language_level, u.canonicalize_language_level, u._canonical_level, level_corpus(rng, 2000)),
+        ("is_present_term_any", loop_is_present_term_any, u.is_present_term_any, u._contains_present_term, date_corpus(rng, 2000)),
+    ]
+    for name, old, new, _, corpus in cases:
+        report(name, "repeated inputs, memo hits", old, new, corpus, iterations)
+    for name, old, new, memo, corpus in cases:
+        report(name, "unique inputs, memo misses", old, new, unique_corpus(rng, corpus), iterations, memo.cache_clear)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import os
+import re
+import threading
+
+# --- CV text preprocessing ---
+# Splits the extracted CV text into sections, counts tokens locally and, when the text
+# is over the budget, compresses it and drops the low-value sections first so the
+# experience/education/languages blocks the prompt depends on always reach the model.
+
+CV_TOKEN_BUDGET = int(os.getenv("CV_TOKEN_BUDGET", "9000"))
+CV_CHUNK_TOKENS = int(os.getenv("CV_CHUNK_TOKENS", "6000"))
+CV_CHUNK_OVERLAP_TOKENS = int(os.getenv("CV_CHUNK_OVERLAP_TOKENS", "300"))
+TOKENIZER_ENCODING = "cl100k_base"  # gpt-3.5-turbo / gpt-4 family
+
+_encoding = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+def get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+                except Exception:
+                    # tiktoken missing or its encoding file unreachable: use the estimate
+                    _encoding_failed = True
+    return _encoding
+
+def count_tokens(text):
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+SECTION_HEADINGS = {
+    "experience": [
+        "experience", "experiences", "professional experience", "professional experiences", "work experience",
+        "work history", "employment history", "career history", "experiência", "experiências",
+        "experiência profissional", "experiências profissionais", "histórico profissional", "trajetória profissional",
+    ],
+    "education": [
+        "education", "academic background", "academic education", "academic formation", "formação",
+        "formação acadêmica", "formação académica", "escolaridade", "educação",
+    ],
+    "languages": ["languages", "language skills", "idiomas", "línguas", "linguas"],
+    "summary": [
+        "summary", "professional summary", "profile", "about me", "objective", "resumo", "resumo profissional",
+        "perfil", "perfil profissional", "sobre mim", "objetivo", "objetivos",
+    ],
+    "skills": [
+        "skills", "technical skills", "competencies", "competências", "habilidades", "conhecimentos",
+        "conhecimentos técnicos", "qualificações",
+    ],
+    "courses": [
+        "courses", "certifications", "certificates", "licenses & certifications", "cursos",
+        "cursos complementares", "certificações", "certificados", "cursos e certificações",
+    ],
+    "references": ["references", "referências", "referencias", "recommendations", "recomendações"],
+    "activities": [
+        "volunteer", "volunteering", "voluntariado", "trabalho voluntário", "interests", "hobbies", "interesses",
+        "awards", "prêmios", "publications", "publicações",
+    ],
+}
+
+# Dropped first to last when over budget; sections not listed are never dropped
+LOW_VALUE_SECTIONS = ["references", "activities", "courses", "skills", "summary"]
+
+HEADING_LOOKUP = {heading: name for name, headings in SECTION_HEADINGS.items() for heading in headings}
+HEADING_STRIP_RE = re.compile(r"[\s:•\-–—|#*_.]+")
+# Also used by pdf_text (which imports this module for count_tokens)
+SPACES_RE = re.compile(r"[ \t\u00a0]+")
+BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+def heading_section(line):
+    if len(line) > 60:
+        return None
+    key = HEADING_STRIP_RE.sub(" ", line.lower()).strip()
+    return HEADING_LOOKUP.get(key)
+
+def detect_sections(text):
+    sections = [{"name": "header", "lines": []}]
+    for line in text.split("\n"):
+        name = heading_section(line.strip())
+        if name:
+            sections.append({"name": name, "lines": [line]})
+        else:
+            sections[-1]["lines"].append(line)
+    return [
+        {"name": s["name"], "text": "\n".join(s["lines"]).strip()}
+        for s in sections if "\n".join(s["lines"]).strip()
+    ]
+
+def compress_text(text):
+    # Collapse whitespace and drop a line only when it repeats the line right before it.
+    # Repeated titles, tasks and dates under different companies must survive; page
+    # headers/footers are already removed by pdf_text's layout mode.
+    lines = []
+    previous = None
+    for line in text.split("\n"):
+        line = SPACES_RE.sub(" ", line).strip()
+        key = line.lower()
+        if line and key == previous:
+            continue
+        previous = key
+        lines.append(line)
+    return BLANK_LINES_RE.sub("\n\n", "\n".join(lines)).strip()
+
+def truncate_to_budget(text, budget):
+    encoding = get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return encoding.decode(tokens[:budget]) if len(tokens) > budget else text
+    return text[:budget * 4]
+
+def preprocess_cv_text(text, budget=None, truncate=True):
+    budget = budget or CV_TOKEN_BUDGET
+    tokens_before = count_tokens(text)
+    sections = detect_sections(text)
+    info = {
+        "tokens_before": tokens_before,
+        "sections": [s["name"] for s in sections],
+        "dropped_sections": [],
+        "truncated": False,
+    }
+    if tokens_before <= budget:
+        info["tokens_after"] = tokens_before
+        return text, info
+
+    for section in sections:
+        section["text"] = compress_text(section["text"])
+        section["tokens"] = count_tokens(section["text"])
+    total = sum(s["tokens"] for s in sections)
+
+    for name in LOW_VALUE_SECTIONS:
+        if total <= budget:
+            break
+        for section in sections:
+            if section["name"] == name and section["tokens"]:
+                total -= section["tokens"]
+                section["tokens"] = 0
+                section["text"] = ""
+                info["dropped_sections"].append(name)
+
+    result = "\n\n".join(s["text"] for s in sections if s["text"])
+    if total > budget and truncate:
+        result = truncate_to_budget(result, budget)
+        info["truncated"] = True
+    info["tokens_after"] = count_tokens(result)
+    return result, info
+
+# --- Chunking for CVs that do not fit in one extraction call ---
+
+def split_paragraphs(text, max_tokens):
+    # Paragraphs (blank-line separated, i.e. layout blocks/pages) are the smallest unit;
+    # a single paragraph over the limit is split by lines.
+    pieces = []
+    for paragraph in text.split("\n\n"):
+        if count_tokens(paragraph) <= max_tokens:
+            pieces.append(paragraph)
+            continue
+        current, current_tokens = [], 0
+        for line in paragraph.split("\n"):
+            line_tokens = count_tokens(line) + 1
+            if current and current_tokens + line_tokens > max_tokens:
+                pieces.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(line)
+            current_tokens += line_tokens
+        if current:
+            pieces.append("\n".join(current))
+    return pieces
+
+def split_into_chunks(text, chunk_tokens=None, overlap_tokens=None):
+    chunk_tokens = chunk_tokens or CV_CHUNK_TOKENS
+    overlap_tokens = CV_CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    pieces = []
+    for section in detect_sections(text):
+        for i, piece in enumerate(split_paragraphs(section["text"], chunk_tokens - overlap_tokens)):
+            # Section starts are preferred chunk boundaries
+            pieces.append((i == 0, piece, count_tokens(piece)))
+
+    chunks, current, current_tokens = [], [], 0
+    for starts_section, piece, piece_tokens in pieces:
+        over = current_tokens + piece_tokens > chunk_tokens
+        soft_break = starts_section and current_tokens > chunk_tokens * 0.75
+        if current and (over or soft_break):
+            chunks.append("\n\n".join(p for p, _ in current))
+            # Carry the tail of the previous chunk so an entry split at the boundary is seen whole
+            overlap, overlap_size = [], 0
+            for p, t in reversed(current):
+                if overlap_size + t > overlap_tokens:
+                    break
+                overlap.insert(0, (p, t))
+                overlap_size += t
+            current, current_tokens = overlap, overlap_size
+        current.append((piece, piece_tokens))
+        current_tokens += piece_tokens
+    if current:
+        chunks.append("\n\n".join(p for p, _ in current))
+    return chunks
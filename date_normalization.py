@@ -0,0 +1,98 @@
+import os
+import re
+from functools import lru_cache
+
+# --- Job/academic date normalization ---
+# CV dates arrive in whatever shape the candidate (or the model) wrote them. They are
+# parsed into compact (year, month) tuples, which compare and sort directly, and only
+# formatted back to MM/YYYY for the template. Parsing is memoized: the same strings
+# repeat across jobs, CVs and report languages.
+
+DATE_MEMO_SIZE = int(os.getenv("DATE_MEMO_SIZE", "4096"))
+MIN_YEAR, MAX_YEAR = 1900, 2100
+
+# PT and EN abbreviations never disagree on a month, so one table serves both
+MONTHS_EN = {
+    "january": 1, "february": 2, "march": 3, "april": 4, "may": 5, "june": 6,
+    "july": 7, "august": 8, "september": 9, "october": 10, "november": 11, "december": 12,
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "sept": 9, "oct": 10, "nov": 11, "dec": 12
+}
+MONTHS_PT = {
+    "janeiro": 1, "fevereiro": 2, "março": 3, "marco": 3, "abril": 4, "maio": 5, "junho": 6,
+    "julho": 7, "agosto": 8, "setembro": 9, "outubro": 10, "novembro": 11, "dezembro": 12,
+    "jan": 1, "fev": 2, "mar": 3, "abr": 4, "mai": 5, "jun": 6,
+    "jul": 7, "ago": 8, "set": 9, "out": 10, "nov": 11, "dez": 12
+}
+MONTHS = {**MONTHS_EN, **MONTHS_PT}
+
+# Prefix matches, like the previous normalizer: "03/2019 (6 months)" still parses
+DAY_MONTH_YEAR_RE = re.compile(r"\d{1,2}\s*[/.\-]\s*(\d{1,2})\s*[/.\-]\s*(\d{4})(?!\d)")
+MONTH_YEAR_RE = re.compile(r"(\d{1,2})\s*[/.\-]\s*(\d{4})(?!\d)")
+YEAR_MONTH_RE = re.compile(r"(\d{4})\s*[/.\-]\s*(\d{1,2})(?![\d/.\-])")
+NAMED_MONTH_RE = re.compile(r"([a-zà-ÿ]+)\.?\s*(?:de\s+|of\s+|[,/\-]\s*)?(\d{4})(?!\d)")
+YEAR_RE = re.compile(r"(\d{4})(?!\d)")
+# "2019 – atual", "mar. 2019 - presente", "03/2019 to 05/2020"; a bare hyphen only
+# separates when spaced, so "2019-03" stays a single date
+RANGE_SEPARATOR_RE = re.compile(r"\s*[–—]\s*|\s+(?:-|to|a|até|ate|until)\s+")
+
+def valid_year_month(year, month):
+    return MIN_YEAR <= year <= MAX_YEAR and 1 <= month <= 12
+
+@lru_cache(maxsize=DATE_MEMO_SIZE)
+def _parse_month_year(text):
+    match = DAY_MONTH_YEAR_RE.match(text) or MONTH_YEAR_RE.match(text)
+    if match:
+        month, year = int(match.group(1)), int(match.group(2))
+        return (year, month) if valid_year_month(year, month) else None
+    match = YEAR_MONTH_RE.match(text)
+    if match:
+        year, month = int(match.group(1)), int(match.group(2))
+        if valid_year_month(year, month):
+            return (year, month)
+    match = NAMED_MONTH_RE.match(text)
+    if match and match.group(1) in MONTHS:
+        year = int(match.group(2))
+        return (year, MONTHS[match.group(1)]) if valid_year_month(year, 1) else None
+    match = YEAR_RE.match(text)
+    if match:
+        year = int(match.group(1))
+        return (year, 1) if valid_year_month(year, 1) else None
+    return None
+
+def parse_month_year(text):
+    if not isinstance(text, str):
+        return None
+    return _parse_month_year(text.strip().lower())
+
+def split_date_range(text):
+    if not isinstance(text, str):
+        return None
+    parts = RANGE_SEPARATOR_RE.split(text.strip(), maxsplit=1)
+    if len(parts) == 2 and parts[0] and parts[1]:
+        return parts[0], parts[1]
+    return None
+
+def split_job_dates(start, end):
+    # A whole range written in one field ("2019 – atual") with the other one empty
+    start_blank = not (isinstance(start, str) and start.strip())
+    end_blank = not (isinstance(end, str) and end.strip())
+    if end_blank and not start_blank:
+        return split_date_range(start) or (start, end)
+    if start_blank and not end_blank:
+        return split_date_range(end) or (start, end)
+    return start, end
+
+def format_month_year(year_month, empty="00/0000"):
+    if not year_month:
+        return empty
+    return f"{year_month[1]:02d}/{year_month[0]}"
+
+# Months since year 0: a single int per date, cheap to compare, min/max and store
+def month_ordinal(year_month):
+    return year_month[0] * 12 + year_month[1] - 1
+
+def format_month_ordinal(ordinal, empty="00/0000"):
+    if ordinal is None:
+        return empty
+    return f"{ordinal % 12 + 1:02d}/{ordinal // 12}"
@@ -0,0 +1,292 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import unified_report_generator as generator
+from progress import PROGRESS, bind as bind_progress
+
+# --- Report job backends ---
+# A job is one CV plus its settings; a worker runs generator.generate_reports and keeps
+# the extracted JSON and the DOCX reports until JOB_TTL_SECONDS after creation.
+#
+# "memory": jobs live in this process and run on a thread pool. Status/results are only
+#   visible to the process that accepted the job, so run the API with one worker process.
+#   Besides the TTL, only the JOB_MAX_FINISHED most recently finished jobs are kept, since
+#   each holds its DOCX bytes in memory.
+# "sqlite": a shared queue stand-in. Jobs, results and reports are rows in one SQLite
+#   file; every process polls and claims queued jobs atomically, so any gunicorn worker
+#   can accept, run or answer for any job. Swap for Redis/SQS by implementing the same
+#   methods (submit, status, result, report).
+
+JOB_BACKEND = os.getenv("JOB_BACKEND", "memory").lower()
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", str(24 * 3600)))
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(generator.CACHE_FOLDER, "jobs.sqlite3"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "0.5"))
+JOB_MAX_FINISHED = int(os.getenv("JOB_MAX_FINISHED", "50"))
+# A running job not updated for this long is assumed lost (crashed worker) and requeued;
+# the worker running it refreshes updated_at every JOB_HEARTBEAT_SECONDS
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "900"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", str(min(60, JOB_STALE_SECONDS / 3))))
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+def execute_job(job_id, file_bytes, settings, store):
+    # Progress events go to the job's channel, opened here so it only exists in the process
+    # that runs the job (see progress.py). The terminal event is published after store()
+    # has saved the output, so a client reacting to "done" can fetch the results.
+    channel = PROGRESS.open(job_id)
+    channel.publish({"event": "job", "status": "running", "at": round(time.time(), 3)})
+    extraction_stats = {}
+    translation_stats = generator.new_translation_stats()
+    try:
+        with bind_progress(channel):
+            output = generator.generate_reports(file_bytes, settings, extraction_stats, translation_stats)
+    except Exception as e:
+        traceback.print_exc()
+        output = {"error": str(e)}
+    if "error" in output:
+        output = {"error": output["error"]}
+    else:
+        output["stats"] = {"extraction": extraction_stats, "translation": translation_stats}
+    try:
+        store(output)
+    except Exception as e:
+        traceback.print_exc()
+        output = {"error": f"Could not save the job output: {e}"}
+        raise
+    finally:
+        if "error" in output:
+            channel.publish({"event": "job", "status": "failed", "error": output["error"], "at": round(time.time(), 3)})
+        else:
+            channel.publish({"event": "job", "status": "done", "translation": translation_stats, "at": round(time.time(), 3)})
+        channel.close()
+
+def public_status(job):
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "report_langs": job["settings"]["report_langs"],
+        "error": job.get("error"),
+    }
+
+class InProcessJobBackend:
+    def __init__(self, workers=None, ttl=None, max_finished=None):
+        self.ttl = ttl or JOB_TTL_SECONDS
+        self.max_finished = max_finished or JOB_MAX_FINISHED
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers or JOB_WORKERS, thread_name_prefix="report-job")
+
+    def submit(self, file_bytes, settings):
+        now = time.time()
+        job = {"id": new_job_id(), "status": "queued", "settings": settings, "created_at": now, "updated_at": now}
+        with self._lock:
+            self._prune(now)
+            self._jobs[job["id"]] = job
+        self._pool.submit(self._run, job, file_bytes)
+        return job["id"]
+
+    def _run(self, job, file_bytes):
+        job.update(status="running", updated_at=time.time())
+        execute_job(job["id"], file_bytes, job["settings"], lambda output: self._store(job, output))
+
+    def _store(self, job, output):
+        if "error" in output:
+            job.update(status="failed", error=output["error"], updated_at=time.time())
+        else:
+            job.update(
+                results=output["results"],
+                reports={language: (filename, report) for language, filename, report in output["reports"]},
+                stats=output["stats"],
+                status="done",
+                updated_at=time.time()
+            )
+
+    def _prune(self, now):
+        for job_id in [job_id for job_id, job in self._jobs.items() if now - job["created_at"] > self.ttl]:
+            self._evict(job_id)
+        # Then the least recently finished jobs over the cap; queued/running jobs stay
+        finished = sorted((job for job in self._jobs.values() if job["status"] in ("done", "failed")), key=lambda job: job["updated_at"])
+        for job in finished[:max(0, len(finished) - self.max_finished)]:
+            self._evict(job["id"])
+
+    def _evict(self, job_id):
+        del self._jobs[job_id]
+        PROGRESS.discard(job_id)
+
+    def _job(self, job_id):
+        with self._lock:
+            self._prune(time.time())
+            return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        job = self._job(job_id)
+        return public_status(job) if job else None
+
+    def result(self, job_id):
+        job = self._job(job_id)
+        return job.get("results") if job else None
+
+    def report(self, job_id, language):
+        job = self._job(job_id)
+        return (job.get("reports") or {}).get(language.upper()) if job else None
+
+class SQLiteJobBackend:
+    def __init__(self, path=None, workers=None, ttl=None):
+        self.path = path or JOB_DB_PATH
+        self.ttl = ttl or JOB_TTL_SECONDS
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, settings TEXT NOT NULL, file BLOB, results TEXT, "
+            "stats TEXT, error TEXT, claim TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_reports ("
+            "job_id TEXT NOT NULL, language TEXT NOT NULL, filename TEXT NOT NULL, data BLOB NOT NULL, "
+            "PRIMARY KEY (job_id, language))"
+        )
+        self._conn.commit()
+        for i in range(workers or JOB_WORKERS):
+            threading.Thread(target=self._work_loop, name=f"report-job-{i}", daemon=True).start()
+
+    def submit(self, file_bytes, settings):
+        job_id = new_job_id()
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, settings, file, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, json.dumps(settings, ensure_ascii=False), bytes(file_bytes), now, now)
+            )
+            self._conn.commit()
+        self._wake.set()
+        return job_id
+
+    def _claim(self):
+        # One UPDATE is atomic across processes; the claim token tells us which row we won
+        claim = new_job_id()
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', claim = ?, updated_at = ? WHERE id = ("
+                "SELECT id FROM jobs WHERE status = 'queued' OR (status = 'running' AND updated_at < ?) "
+                "ORDER BY created_at LIMIT 1)",
+                (claim, now, now - JOB_STALE_SECONDS)
+            )
+            self._conn.commit()
+            return self._conn.execute("SELECT id, settings, file, claim FROM jobs WHERE claim = ?", (claim,)).fetchone()
+
+    def _work_loop(self):
+        while True:
+            try:
+                row = self._claim()
+                if row is None:
+                    self._prune()
+                    self._wake.wait(JOB_POLL_SECONDS)
+                    self._wake.clear()
+                    continue
+                job_id, settings, file_bytes, claim = row
+                stop_heartbeat = threading.Event()
+                threading.Thread(
+                    target=self._heartbeat, args=(job_id, claim, stop_heartbeat), name=f"report-job-heartbeat-{job_id[:8]}", daemon=True
+                ).start()
+                try:
+                    execute_job(job_id, file_bytes, json.loads(settings), lambda output: self._finish(job_id, claim, output))
+                finally:
+                    stop_heartbeat.set()
+            except Exception:
+                traceback.print_exc()
+                time.sleep(JOB_POLL_SECONDS)
+
+    def _heartbeat(self, job_id, claim, stop):
+        # Keeps a long job from looking stale to _claim in other workers
+        while not stop.wait(JOB_HEARTBEAT_SECONDS):
+            try:
+                with self._lock:
+                    self._conn.execute(
+                        "UPDATE jobs SET updated_at = ? WHERE id = ? AND claim = ? AND status = 'running'",
+                        (time.time(), job_id, claim)
+                    )
+                    self._conn.commit()
+            except Exception:
+                traceback.print_exc()
+
+    def _finish(self, job_id, claim, output):
+        # Only the worker holding the claim may write; if the job was requeued and claimed
+        # again elsewhere, that run's output wins
+        now = time.time()
+        with self._lock:
+            if "error" in output:
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, file = NULL, updated_at = ? WHERE id = ? AND claim = ?",
+                    (output["error"], now, job_id, claim)
+                )
+            else:
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET status = 'done', results = ?, stats = ?, file = NULL, updated_at = ? WHERE id = ? AND claim = ?",
+                    (json.dumps(output["results"], ensure_ascii=False), json.dumps(output["stats"], default=str), now, job_id, claim)
+                )
+                if cursor.rowcount:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO job_reports (job_id, language, filename, data) VALUES (?, ?, ?, ?)",
+                        [(job_id, language, filename, report) for language, filename, report in output["reports"]]
+                    )
+            self._conn.commit()
+        if not cursor.rowcount:
+            raise RuntimeError(f"Job {job_id} was claimed by another worker; this run's output was discarded")
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            self._conn.execute("DELETE FROM job_reports WHERE job_id IN (SELECT id FROM jobs WHERE created_at < ?)", (cutoff,))
+            self._conn.execute("DELETE FROM jobs WHERE created_at < ?", (cutoff,))
+            self._conn.commit()
+
+    def status(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, settings, error, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(("id", "status", "settings", "error", "created_at", "updated_at"), row))
+        job["settings"] = json.loads(job["settings"])
+        return public_status(job)
+
+    def result(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT results FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def report(self, job_id, language):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT filename, data FROM job_reports WHERE job_id = ? AND language = ?", (job_id, language.upper())
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+JOB_BACKENDS = {
+    "memory": InProcessJobBackend,
+    "sqlite": SQLiteJobBackend,
+}
+
+def create_job_backend(name=None):
+    name = (name or JOB_BACKEND).lower()
+    if name not in JOB_BACKENDS:
+        raise ValueError(f"Unknown JOB_BACKEND {name!r}; expected one of {sorted(JOB_BACKENDS)}")
+    return JOB_BACKENDS[name]()
@@ -0,0 +1,166 @@
+import json
+
+# --- Incremental JSON parsing for streamed completions ---
+# Feed the completion text as it arrives; the parser reports each top-level field of the
+# root object once its value is complete, and each element of a top-level list as soon as
+# that element closes (e.g. every finished line_items entry). Text before the first "{"
+# (prose, code fences) is ignored.
+
+class IncrementalJSONParser:
+    def __init__(self):
+        self.text = ""
+        self.pos = 0
+        self.stack = []
+        self.started = False
+        self.done = False
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.expect_key = True
+        self.key = None
+        self.value_start = None
+        self.item_start = None
+        self.item_index = 0
+
+    def _in_top_list(self):
+        return len(self.stack) == 2 and self.stack[-1] == "["
+
+    def _field(self, events, raw):
+        try:
+            events.append(("field", self.key, json.loads(raw)))
+        except ValueError:
+            pass
+        self.value_start = None
+
+    def _item(self, events, raw):
+        try:
+            events.append(("item", self.key, self.item_index, json.loads(raw)))
+        except ValueError:
+            pass
+        self.item_start = None
+        self.item_index += 1
+
+    def feed(self, chunk):
+        self.text += chunk
+        text = self.text
+        events = []
+        while self.pos < len(text) and not self.done:
+            i = self.pos
+            c = text[i]
+            self.pos += 1
+            if not self.started:
+                if c == "{":
+                    self.started = True
+                    self.stack.append("{")
+                continue
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    if len(self.stack) == 1 and self.expect_key:
+                        self.key = json.loads(text[self.string_start:i + 1])
+                continue
+            depth = len(self.stack)
+            if c in " \t\r\n":
+                continue
+            if c in "}]":
+                if self._in_top_list() and self.item_start is not None:
+                    self._item(events, text[self.item_start:i].strip())
+                if depth == 1 and self.value_start is not None:
+                    self._field(events, text[self.value_start:i].strip())
+                self.stack.pop()
+                if self._in_top_list():
+                    self._item(events, text[self.item_start:i + 1])
+                elif len(self.stack) == 1:
+                    self._field(events, text[self.value_start:i + 1])
+                elif not self.stack:
+                    self.done = True
+                continue
+            if c == ",":
+                if depth == 1:
+                    if self.value_start is not None:
+                        self._field(events, text[self.value_start:i].strip())
+                    self.expect_key = True
+                elif self._in_top_list() and self.item_start is not None:
+                    self._item(events, text[self.item_start:i].strip())
+                continue
+            if c == ":":
+                if depth == 1:
+                    self.expect_key = False
+                continue
+            # Start of a value (string, object, array or scalar)
+            if depth == 1 and not self.expect_key and self.value_start is None:
+                self.value_start = i
+            elif self._in_top_list() and self.item_start is None:
+                self.item_start = i
+            if c == '"':
+                self.in_string = True
+                self.string_start = i
+            elif c in "{[":
+                self.stack.append(c)
+                if len(self.stack) == 2 and c == "[":
+                    self.item_index = 0
+        return events
+
+# --- Local repair of almost-JSON model output ---
+# Strips code fences and surrounding prose, keeps the outermost object, drops trailing
+# commas, escapes raw newlines inside strings and closes whatever a truncated answer
+# left open. Returns the parsed object or None.
+
+JSON_STRING_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+def strip_trailing_comma(out):
+    i = len(out) - 1
+    while i >= 0 and out[i] in " \t\r\n":
+        i -= 1
+    if i >= 0 and out[i] == ",":
+        del out[i:]
+
+def repair_json(text):
+    if not isinstance(text, str):
+        return None
+    text = text.replace("```json", "").replace("```JSON", "").replace("```", "")
+    start = text.find("{")
+    if start < 0:
+        return None
+    out, stack = [], []
+    in_string = escape = False
+    for c in text[start:]:
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+            elif c in JSON_STRING_ESCAPES:
+                c = JSON_STRING_ESCAPES[c]
+            out.append(c)
+            continue
+        if c == '"':
+            in_string = True
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+        elif c in "}]":
+            if not stack:
+                break
+            strip_trailing_comma(out)
+            out.append(stack.pop())
+            if not stack:
+                break
+            continue
+        out.append(c)
+    if in_string:
+        out.append('"')
+    strip_trailing_comma(out)
+    repaired = "".join(out).rstrip()
+    if repaired.endswith(":"):
+        repaired += " null"
+    repaired += "".join(reversed(stack))
+    try:
+        return json.loads(repaired)
+    except ValueError:
+        return None
@@ -0,0 +1,73 @@
+import re
+
+# --- Local language identification (PT / EN / ES) ---
+# Stopword ratio plus a few orthographic cues. It only has to be good enough to tell
+# whether a CV string is already in the report language; when unsure it returns None
+# and the string goes to the translator as before.
+
+STOPWORDS = {
+    "PT": {
+        "de", "da", "do", "das", "dos", "e", "em", "no", "na", "nos", "nas", "para", "com", "por", "pelo", "pela",
+        "um", "uma", "o", "a", "os", "as", "que", "ao", "aos", "à", "às", "se", "ou", "como", "mais", "sobre",
+        "entre", "até", "sua", "seu", "suas", "seus", "não", "também", "foi", "são", "é", "atual", "anos",
+    },
+    "EN": {
+        "the", "of", "and", "to", "in", "for", "with", "on", "at", "by", "from", "a", "an", "as", "or", "is", "are",
+        "was", "were", "be", "been", "this", "that", "these", "those", "my", "our", "their", "its", "into", "over",
+        "under", "about", "all", "new", "years", "current", "present", "such", "other", "which", "who",
+    },
+    "ES": {
+        "de", "la", "el", "los", "las", "y", "en", "para", "con", "por", "del", "al", "un", "una", "que", "como",
+        "más", "sobre", "entre", "hasta", "su", "sus", "también", "fue", "son", "es", "años", "actual", "lo",
+    },
+}
+
+SUFFIXES = {
+    "PT": ("ção", "ções", "mento", "mentos", "idade", "ável", "ência", "ância", "agem", "eiro", "eira"),
+    "EN": ("tion", "tions", "ing", "ment", "ments", "ness", "ship", "ity", "ed", "ly"),
+    "ES": ("ción", "ciones", "miento", "dad", "ería"),
+}
+
+LETTER_CUES = {
+    "PT": ("ã", "õ", "ç", "ê", "ô"),
+    "ES": ("ñ", "¿", "¡"),
+}
+
+MIN_SCORE = 0.25
+MIN_MARGIN = 0.2
+
+TOKEN_RE = re.compile(r"[a-zà-öø-ÿ]+")
+
+def language_scores(text):
+    text = text.lower()
+    tokens = TOKEN_RE.findall(text)
+    scores = {lang: 0.0 for lang in STOPWORDS}
+    if not tokens:
+        return scores, 0
+    for token in tokens:
+        hits = [lang for lang, words in STOPWORDS.items() if token in words]
+        for lang in hits:
+            scores[lang] += 1.0 / len(hits)
+        if len(token) > 4:
+            for lang, suffixes in SUFFIXES.items():
+                if token.endswith(suffixes):
+                    scores[lang] += 0.5
+                    break
+    for lang, cues in LETTER_CUES.items():
+        scores[lang] += 0.75 * sum(text.count(c) for c in cues)
+    return {lang: score / len(tokens) for lang, score in scores.items()}, len(tokens)
+
+def detect_language(text, min_tokens=2):
+    if not isinstance(text, str):
+        return None
+    scores, token_count = language_scores(text)
+    if token_count < min_tokens:
+        return None
+    ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+    (best, best_score), (_, second_score) = ranked[0], ranked[1]
+    if best_score < MIN_SCORE or best_score - second_score < MIN_MARGIN:
+        return None
+    return best
+
+def is_in_language(text, lang):
+    return detect_language(text) == lang.upper()
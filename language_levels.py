@@ -0,0 +1,252 @@
+import os
+import io
+import csv
+import json
+import time
+import logging
+import threading
+import traceback
+from types import MappingProxyType
+import requests
+
+# --- Language level table provider ---
+# The level table lives in a Google Sheet. The provider starts from a local snapshot (or a
+# copy bundled with the deployment) and refreshes it in a background thread with
+# ETag/If-Modified-Since, at most once per TTL per host (the snapshot metadata on disk is
+# shared by every worker). With no local copy at all (fresh container) the first fetch
+# blocks, since an empty table means no level dropdown and blank level descriptions. A refresh builds a complete new
+# LevelTable and swaps the reference in one assignment, so readers never see a
+# half-built table.
+#
+# A LevelTable is an immutable index compiled once per load: exact lookups by level id
+# and by PT/EN title, plus a precomputed substring table for partial matches.
+
+LEVEL_COLUMNS = [
+    "language_level", "language_level_title_pt", "language_level_title_en",
+    "level_description_pt", "level_description_en"
+]
+
+logger = logging.getLogger("report_generator.language_levels")
+
+def normalize_level_key(value):
+    return " ".join(str(value).split()).lower() if value is not None else ""
+
+def freeze(mapping):
+    return MappingProxyType(dict(mapping))
+
+class LevelTable:
+    def __init__(self, rows):
+        self.rows = tuple(freeze({c: (row.get(c) or "").strip() for c in LEVEL_COLUMNS}) for row in rows)
+        self.level_ids = tuple(row["language_level"] for row in self.rows if row["language_level"])
+        self.by_id = freeze((normalize_level_key(row["language_level"]), row) for row in self.rows if row["language_level"])
+        self.pt_levels = self._title_index("pt")
+        self.en_levels = self._title_index("en")
+        self._titles = {"PT": tuple(self.pt_levels), "EN": tuple(self.en_levels)}
+        self._substrings = {"PT": self._substring_index(self.pt_levels), "EN": self._substring_index(self.en_levels)}
+
+    def _title_index(self, lang):
+        index = {}
+        for row in self.rows:
+            title = normalize_level_key(row[f"language_level_title_{lang}"])
+            if title and title not in index:
+                index[title] = freeze({
+                    "language_level": row[f"language_level_title_{lang}"],
+                    "level_description": row[f"level_description_{lang}"]
+                })
+        return freeze(index)
+
+    @staticmethod
+    def _substring_index(levels):
+        # Every substring of every title -> position of the first title containing it
+        index = {}
+        for position, title in enumerate(levels):
+            for start in range(len(title)):
+                for stop in range(start + 1, len(title) + 1):
+                    index.setdefault(title[start:stop], position)
+        return freeze(index)
+
+    def levels(self, lang):
+        return self.pt_levels if lang.upper() == "PT" else self.en_levels
+
+    def entry_for_id(self, level_id, lang):
+        row = self.by_id.get(normalize_level_key(level_id))
+        if row is None:
+            return None
+        return self.levels(lang).get(normalize_level_key(row[f"language_level_title_{lang.lower()}"]))
+
+    def description_for_id(self, level_id, lang):
+        row = self.by_id.get(normalize_level_key(level_id))
+        return row[f"level_description_{lang.lower()}"] if row is not None else ""
+
+    def find(self, value, lang):
+        lang = "PT" if lang.upper() == "PT" else "EN"
+        key = normalize_level_key(value)
+        if not key:
+            return None
+        levels = self.levels(lang)
+        if key in levels:
+            return levels[key]
+        entry = self.entry_for_id(key, lang)
+        if entry is not None:
+            return entry
+        # Partial match with the same precedence as a scan in table order: the first title
+        # that contains the key or is contained in it
+        titles = self._titles[lang]
+        position = self._substrings[lang].get(key, len(titles))
+        for i in range(position):
+            if titles[i] in key:
+                position = i
+                break
+        return levels[titles[position]] if position < len(titles) else None
+
+def load_level_table(source):
+    if isinstance(source, (bytes, bytearray)):
+        text = source.decode("utf-8-sig")
+    else:
+        with open(source, "r", encoding="utf-8-sig", newline="") as f:
+            text = f.read()
+    return LevelTable(list(csv.DictReader(io.StringIO(text))))
+
+def empty_level_table():
+    return LevelTable([])
+
+def snapshot_is_fresh(meta, ttl):
+    return time.time() - meta.get("fetched_at", 0) < ttl
+
+class LevelTableProvider:
+    def __init__(self, url, snapshot_path, bundled_path=None, ttl=6 * 3600, timeout=15):
+        self.url = url
+        self.snapshot_path = snapshot_path
+        self.meta_path = snapshot_path + ".meta.json"
+        self.lock_path = snapshot_path + ".lock"
+        self.bundled_path = bundled_path
+        self.ttl = ttl
+        self.timeout = timeout
+        self._table = None
+        self._loaded_mtime = None
+        self._next_check = 0
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._table = self._load_local()
+        if self._table is None:
+            self._table = empty_level_table()
+            self._fetch_initial()
+
+    def table(self):
+        self.refresh_if_stale()
+        return self._table
+
+    def _load_local(self):
+        for path in (self.snapshot_path, self.bundled_path):
+            if path and os.path.isfile(path):
+                try:
+                    table = load_level_table(path)
+                    if path == self.snapshot_path:
+                        self._loaded_mtime = os.path.getmtime(path)
+                    return table
+                except Exception:
+                    traceback.print_exc()
+        return None
+
+    def _fetch_initial(self):
+        try:
+            self.refresh(force=True)
+        except Exception:
+            traceback.print_exc()
+        if not self._table.rows:
+            logger.warning(
+                "No language level table: %s could not be fetched and there is no local copy at %s. "
+                "Level dropdowns and descriptions stay empty until a background refresh succeeds.",
+                self.url, self.snapshot_path
+            )
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def refresh_if_stale(self, background=True):
+        now = time.time()
+        if now < self._next_check or self._refreshing:
+            return
+        with self._lock:
+            if now < self._next_check or self._refreshing:
+                return
+            self._next_check = now + min(self.ttl, 60)
+            # Another worker on this host may already have refreshed the snapshot
+            if os.path.isfile(self.snapshot_path) and os.path.getmtime(self.snapshot_path) != self._loaded_mtime:
+                table = self._load_local()
+                if table is not None:
+                    self._table = table
+            if snapshot_is_fresh(self._read_meta(), self.ttl):
+                return
+            self._refreshing = True
+        if background:
+            threading.Thread(target=self._refresh_guarded, name="level-table-refresh", daemon=True).start()
+        else:
+            self._refresh_guarded()
+
+    def _refresh_guarded(self):
+        try:
+            if self._acquire_host_lock():
+                try:
+                    self.refresh()
+                finally:
+                    self._release_host_lock()
+        except Exception:
+            traceback.print_exc()
+        finally:
+            self._refreshing = False
+
+    def _acquire_host_lock(self):
+        os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+        try:
+            if time.time() - os.path.getmtime(self.lock_path) > 300:
+                os.remove(self.lock_path)  # stale lock from a crashed worker
+        except OSError:
+            pass
+        try:
+            os.close(os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            return False
+
+    def _release_host_lock(self):
+        try:
+            os.remove(self.lock_path)
+        except OSError:
+            pass
+
+    def refresh(self, force=False):
+        # force: fetch unconditionally, for when no usable local copy is loaded
+        meta = self._read_meta()
+        if not force and snapshot_is_fresh(meta, self.ttl):
+            return
+        headers = {}
+        if not force and os.path.isfile(self.snapshot_path):
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        response = requests.get(self.url, headers=headers, timeout=self.timeout)
+        if response.status_code != 304:
+            response.raise_for_status()
+            table = load_level_table(response.content)
+            self._write_atomic(self.snapshot_path, response.content)
+            self._loaded_mtime = os.path.getmtime(self.snapshot_path)
+            self._table = table
+            meta = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified")
+            }
+        meta["fetched_at"] = time.time()
+        self._write_atomic(self.meta_path, json.dumps(meta).encode("utf-8"))
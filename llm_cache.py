@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import traceback
+from collections import OrderedDict
+
+# --- Two-tier cache for LLM results ---
+# An in-memory LRU sits in front of a local SQLite table so results survive restarts.
+# Values must be JSON serializable.
+
+MISSING = object()
+
+def make_key(*parts):
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def normalize_text(text):
+    return " ".join(text.split()) if isinstance(text, str) else text
+
+class LRUCache:
+    def __init__(self, max_entries=2048, max_age=None):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return MISSING
+            value, stored_at = entry
+            if self.max_age and time.time() - stored_at > self.max_age:
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, stored_at=None):
+        with self._lock:
+            self._data[key] = (value, stored_at or time.time())
+            self._data.move_to_end(key)
+            evicted = 0
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class SQLiteCache:
+    def __init__(self, path, table="cache", max_entries=50000, max_age=None, prune_every=200):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.prune_every = prune_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return MISSING, None
+            value, created_at = row
+            if self.max_age and now - created_at > self.max_age:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                return MISSING, None
+            self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(value), created_at
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            self._conn.commit()
+            self._writes += 1
+            if self._writes % self.prune_every == 0:
+                return self._prune()
+        return 0
+
+    def _prune(self):
+        evicted = 0
+        if self.max_age:
+            evicted += self._conn.execute(
+                f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - self.max_age,)
+            ).rowcount
+        count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        if count > self.max_entries:
+            evicted += self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_entries,)
+            ).rowcount
+        self._conn.commit()
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+class TieredCache:
+    def __init__(self, name, path=None, memory_entries=2048, disk_entries=50000, max_age=None):
+        self.name = name
+        self.memory = LRUCache(memory_entries, max_age)
+        self.disk = None
+        if path:
+            try:
+                self.disk = SQLiteCache(path, table=name, max_entries=disk_entries, max_age=max_age)
+            except Exception:
+                # An unusable cache file must never take the app down; keep the memory tier only
+                traceback.print_exc()
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def get(self, key, default=None):
+        value = self.memory.get(key)
+        if value is not MISSING:
+            self._count("memory_hits")
+            return value
+        if self.disk is not None:
+            try:
+                value, created_at = self.disk.get(key)
+            except Exception:
+                traceback.print_exc()
+                value, created_at = MISSING, None
+            if value is not MISSING:
+                self._count("disk_hits")
+                self._count("evictions", self.memory.set(key, value, created_at))
+                return value
+        self._count("misses")
+        return default
+
+    def set(self, key, value):
+        evicted = self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                evicted += self.disk.set(key, value)
+            except Exception:
+                traceback.print_exc()
+        self._count("writes")
+        self._count("evictions", evicted)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["memory_entries"] = len(self.memory)
+        return stats
@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import functools
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+
+# --- Pipeline metrics ---
+# Latency histograms per pipeline stage and per OpenAI HTTP call, token counters per
+# stage/model, plus whatever the registered collectors report at scrape time (cache hit
+# rates, JSON recovery counts). render() produces the Prometheus text format for /metrics.
+#
+# METRICS_ENABLED=0 turns it off at import time: timed() returns the function unchanged
+# and no HTTP hooks are installed, so disabled metrics cost nothing per call.
+# METRICS_LOG=1 also writes one JSON line per stage/OpenAI call to the
+# "report_generator.metrics" logger (stderr unless the host configures logging).
+#
+# Values are per process; with several gunicorn workers each scrape sees one worker.
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+METRICS_LOG = os.getenv("METRICS_LOG", "0") != "0"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Innermost timed stage of the current call; OpenAI calls are attributed to it
+CURRENT_STAGE = ContextVar("metrics_stage", default="none")
+
+metrics_logger = logging.getLogger("report_generator.metrics")
+if METRICS_LOG and not metrics_logger.handlers:
+    metrics_logger.addHandler(logging.StreamHandler(sys.stderr))
+    metrics_logger.setLevel(logging.INFO)
+    metrics_logger.propagate = False
+
+def log_metric(kind, **fields):
+    if METRICS_LOG:
+        metrics_logger.info(json.dumps({"metric": kind, "at": round(time.time(), 3), **fields}, ensure_ascii=False, default=str))
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def format_labels(names, values, extra=""):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{format_labels(self.label_names, labels)} {format_value(value)}"
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            snapshot = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        for labels, (counts, total) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{format_value(bound)}"'
+                yield f"{self.name}_bucket{format_labels(self.label_names, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.label_names, labels)} {format_value(total)}"
+            yield f"{self.name}_count{format_labels(self.label_names, labels)} {cumulative}"
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, label_names=()):
+        metric = Counter(name, help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help_text, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        # collector() -> [(name, type, help, [(labels dict, value), ...]), ...], read at scrape time
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for collector in self._collectors:
+            for name, kind, help_text, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{format_labels(labels.keys(), labels.values())} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram("report_stage_seconds", "Wall time of a pipeline stage.", ("stage",))
+STAGE_ERRORS = REGISTRY.counter("report_stage_errors_total", "Pipeline stages that raised or returned an error dict.", ("stage",))
+OPENAI_REQUEST_SECONDS = REGISTRY.histogram(
+    "openai_request_seconds", "OpenAI HTTP request latency, retries counted separately.", ("stage", "model", "status")
+)
+OPENAI_TOKENS = REGISTRY.counter("openai_tokens_total", "Tokens reported by OpenAI responses.", ("stage", "model", "kind"))
+
+# --- Stage timing ---
+
+def record_stage(stage, seconds, failed):
+    STAGE_SECONDS.observe(seconds, (stage,))
+    if failed:
+        STAGE_ERRORS.inc((stage,))
+    log_metric("stage", stage=stage, seconds=round(seconds, 4), ok=not failed)
+
+def is_error_result(result):
+    return isinstance(result, dict) and "error" in result
+
+def timed(stage):
+    def decorate(func):
+        if not METRICS_ENABLED:
+            return func
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                token = CURRENT_STAGE.set(stage)
+                started = time.perf_counter()
+                failed = True
+                try:
+                    result = await func(*args, **kwargs)
+                    failed = is_error_result(result)
+                    return result
+                finally:
+                    record_stage(stage, time.perf_counter() - started, failed)
+                    CURRENT_STAGE.reset(token)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = CURRENT_STAGE.set(stage)
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = func(*args, **kwargs)
+                failed = is_error_result(result)
+                return result
+            finally:
+                record_stage(stage, time.perf_counter() - started, failed)
+                CURRENT_STAGE.reset(token)
+        return wrapper
+    return decorate
+
+# --- OpenAI calls (httpx event hooks) ---
+# The request hook stamps the start time after any rate-limit wait (hooks run in order);
+# the response hook reads JSON bodies for usage. Streamed responses are timed to the
+# first byte; their usage only arrives in the last chunk, so the caller that consumes
+# the stream reports it with record_tokens().
+
+def request_model(request):
+    try:
+        return json.loads(request.content).get("model", "unknown")
+    except Exception:
+        return "unknown"
+
+def is_json_response(response):
+    return response.headers.get("content-type", "").startswith("application/json")
+
+def record_tokens(model, prompt_tokens, completion_tokens, stage=None):
+    if not METRICS_ENABLED:
+        return
+    stage = stage or CURRENT_STAGE.get()
+    OPENAI_TOKENS.inc((stage, model, "prompt"), prompt_tokens or 0)
+    OPENAI_TOKENS.inc((stage, model, "completion"), completion_tokens or 0)
+
+def record_openai_call(response, stage):
+    request = response.request
+    seconds = time.perf_counter() - request.extensions.get("metrics_started", time.perf_counter())
+    model = request_model(request)
+    OPENAI_REQUEST_SECONDS.observe(seconds, (stage, model, str(response.status_code)))
+    usage = None
+    if response.status_code == 200 and is_json_response(response):
+        try:
+            usage = response.json().get("usage")
+        except Exception:
+            usage = None
+    if usage:
+        record_tokens(model, usage.get("prompt_tokens"), usage.get("completion_tokens"), stage)
+    log_metric(
+        "openai_call", stage=stage, model=model, status=response.status_code, seconds=round(seconds, 4),
+        prompt_tokens=(usage or {}).get("prompt_tokens"), completion_tokens=(usage or {}).get("completion_tokens")
+    )
+
+def openai_metrics_hooks(is_async=False):
+    if not METRICS_ENABLED:
+        return {}
+
+    def start_timer(request):
+        request.extensions["metrics_started"] = time.perf_counter()
+
+    if is_async:
+        async def async_start_timer(request):
+            start_timer(request)
+
+        async def async_record(response):
+            if is_json_response(response):
+                await response.aread()
+            record_openai_call(response, CURRENT_STAGE.get())
+        return {"request": [async_start_timer], "response": [async_record]}
+
+    def record(response):
+        if is_json_response(response):
+            response.read()
+        record_openai_call(response, CURRENT_STAGE.get())
+    return {"request": [start_timer], "response": [record]}
@@ -0,0 +1,258 @@
+import os
+import re
+import threading
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import fitz  # PyMuPDF
+from metrics import timed
+from cv_preprocess import count_tokens, SPACES_RE, BLANK_LINES_RE
+
+# --- PDF text extraction ---
+# Works on in-memory PDF bytes so uploads and HTTP bodies never touch the disk.
+# Long documents (CV plus certificates/portfolio) are split into page ranges and
+# extracted on a process pool; short ones stay serial to avoid the pool overhead.
+#
+# "layout" mode reads text column by column (blocks are re-split at column gutters, since
+# PyMuPDF merges columns whose lines share a baseline into one block), drops repeated
+# headers/footers and page numbers in the page margins, and collapses whitespace; "raw"
+# mode is plain page.get_text().
+
+PDF_TEXT_MODE = os.getenv("PDF_TEXT_MODE", "layout").lower()
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "12"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+def get_pdf_pool():
+    global _pdf_pool
+    if _pdf_pool is None:
+        with _pdf_pool_lock:
+            if _pdf_pool is None:
+                # spawn: forking a threaded server/Streamlit process is not safe
+                _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pdf_pool
+
+def reset_pdf_pool(pool):
+    # A worker died (BrokenProcessPool): drop the pool so the next caller gets a fresh one
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is pool:
+            _pdf_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def as_pdf_stream(source):
+    if isinstance(source, memoryview):
+        return source.tobytes()
+    return source
+
+def open_pdf(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=as_pdf_stream(source), filetype="pdf")
+    return fitz.open(source)
+
+def read_pdf_bytes(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return as_pdf_stream(source)
+    with open(source, "rb") as f:
+        return f.read()
+
+# --- Layout-aware page reading ---
+
+EDGE_MARGIN = 0.08         # top/bottom share of the page where headers/footers live
+MIN_COLUMN_GAP = 18        # points of empty horizontal space that separate two columns
+WIDE_BLOCK_RATIO = 0.6     # blocks wider than this share of the text area span all columns
+REPEATED_EDGE_RATIO = 0.5  # an edge block on at least this share of pages is a header/footer
+
+PAGE_NUMBER_RE = re.compile(r"^(page|página|pagina|pág\.?|pag\.?)?\s*\d{1,3}(\s*(/|of|de)\s*\d{1,3})?$", re.IGNORECASE)
+DIGITS_RE = re.compile(r"\d+")
+
+def clean_block_text(text):
+    lines = (SPACES_RE.sub(" ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+def line_fragments(line):
+    # A line's spans, cut wherever the horizontal gap between two of them is a gutter
+    fragments = []
+    for span in sorted(line["spans"], key=lambda span: span["bbox"][0]):
+        x0, y0, x1, y1 = span["bbox"]
+        if fragments and x0 - fragments[-1][2] < MIN_COLUMN_GAP:
+            last = fragments[-1]
+            fragments[-1] = [last[0], min(last[1], y0), max(last[2], x1), max(last[3], y1), last[4] + span["text"]]
+        else:
+            fragments.append([x0, y0, x1, y1, span["text"]])
+    return fragments
+
+def column_boundaries(blocks, text_width):
+    intervals = sorted((b[0], b[2]) for b in blocks if b[2] - b[0] < WIDE_BLOCK_RATIO * text_width)
+    boundaries = []
+    if not intervals:
+        return boundaries
+    _, reach = intervals[0]
+    for x0, x1 in intervals[1:]:
+        if x0 - reach >= MIN_COLUMN_GAP:
+            boundaries.append((reach + x0) / 2)
+        reach = max(reach, x1)
+    return boundaries
+
+def page_boundaries(blocks):
+    left = min(b[0] for b in blocks)
+    right = max(b[2] for b in blocks)
+    return column_boundaries(blocks, right - left)
+
+def column_of(block, boundaries):
+    for i, boundary in enumerate(boundaries):
+        if block[0] < boundary < block[2]:
+            return None  # crosses a gutter: spans all columns
+        if block[2] <= boundary:
+            return i
+    return len(boundaries)
+
+def page_text_blocks(page):
+    # Blocks from page.get_text("dict"), regrouped so each holds one column's lines
+    pieces = []
+    for index, block in enumerate(page.get_text("dict")["blocks"]):
+        if block["type"] != 0:
+            continue  # image block
+        for line in block["lines"]:
+            pieces.extend((index, fragment) for fragment in line_fragments(line) if fragment[4].strip())
+    if not pieces:
+        return []
+    boundaries = page_boundaries([fragment for _, fragment in pieces])
+    groups = {}
+    for index, fragment in pieces:
+        key = (index, column_of(fragment, boundaries))
+        group = groups.get(key)
+        if group is None:
+            groups[key] = fragment[:4] + [[fragment[4]]]
+        else:
+            group[0], group[1] = min(group[0], fragment[0]), min(group[1], fragment[1])
+            group[2], group[3] = max(group[2], fragment[2]), max(group[3], fragment[3])
+            group[4].append(fragment[4])
+    blocks = []
+    for x0, y0, x1, y1, lines in groups.values():
+        text = clean_block_text("\n".join(lines))
+        if text:
+            blocks.append((x0, y0, x1, y1, text))
+    return blocks
+
+def order_page_blocks(blocks):
+    if not blocks:
+        return []
+    boundaries = page_boundaries(blocks)
+    if not boundaries:
+        return sorted(blocks, key=lambda b: (round(b[1], 1), b[0]))
+
+    ordered = []
+    band = []
+    # Wide blocks (titles, section headers across the page) split the page into bands;
+    # inside a band every column is read top to bottom before moving right.
+    def flush_band():
+        band.sort(key=lambda cb: (cb[0], cb[1][1], cb[1][0]))
+        ordered.extend(b for _, b in band)
+        band.clear()
+
+    for block in sorted(blocks, key=lambda b: (b[1], b[0])):
+        column = column_of(block, boundaries)
+        if column is None:
+            flush_band()
+            ordered.append(block)
+        else:
+            band.append((column, block))
+    flush_band()
+    return ordered
+
+def read_page_layout(page):
+    height = page.rect.height
+    texts, edges = [], []
+    for block in order_page_blocks(page_text_blocks(page)):
+        text = block[4]
+        on_edge = block[3] <= height * EDGE_MARGIN or block[1] >= height * (1 - EDGE_MARGIN)
+        if on_edge and PAGE_NUMBER_RE.match(text):
+            continue
+        texts.append(text)
+        edges.append(DIGITS_RE.sub("#", text.lower()) if on_edge else None)
+    return {"blocks": texts, "edges": edges, "raw_tokens": count_tokens(page.get_text())}
+
+def assemble_layout_text(pages):
+    edge_counts = {}
+    for page in pages:
+        for key in set(k for k in page["edges"] if k):
+            edge_counts[key] = edge_counts.get(key, 0) + 1
+    repeated = set()
+    if len(pages) > 1:
+        repeated = {k for k, n in edge_counts.items() if n >= max(2, REPEATED_EDGE_RATIO * len(pages))}
+    parts = []
+    for page in pages:
+        parts.extend(text for text, edge in zip(page["blocks"], page["edges"]) if edge not in repeated)
+    return BLANK_LINES_RE.sub("\n\n", "\n\n".join(parts)).strip()
+
+def read_page(page, mode):
+    if mode == "layout":
+        return read_page_layout(page)
+    return page.get_text()
+
+def extract_page_range(pdf_bytes, start, stop, mode="raw"):
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return [read_page(doc[i], mode) for i in range(start, stop)]
+
+def page_ranges(page_count, parts):
+    size, extra = divmod(page_count, parts)
+    ranges, start = [], 0
+    for i in range(parts):
+        stop = start + size + (1 if i < extra else 0)
+        if stop > start:
+            ranges.append((start, stop))
+        start = stop
+    return ranges
+
+def extract_pages_parallel(pdf_bytes, page_count, mode):
+    pool = get_pdf_pool()
+    try:
+        futures = [pool.submit(extract_page_range, pdf_bytes, start, stop, mode) for start, stop in page_ranges(page_count, PDF_WORKERS)]
+        pages = []
+        for future in futures:
+            pages.extend(future.result())
+        return pages
+    except BrokenProcessPool:
+        reset_pdf_pool(pool)
+        raise
+
+def extract_pages(source, mode, parallel=True):
+    with open_pdf(source) as doc:
+        page_count = doc.page_count
+        if not parallel or page_count < PDF_PARALLEL_MIN_PAGES or PDF_WORKERS < 2:
+            return [read_page(page, mode) for page in doc]
+    try:
+        return extract_pages_parallel(read_pdf_bytes(source), page_count, mode)
+    except Exception:
+        # Pool unavailable (e.g. sandboxed host): fall back to the serial path
+        traceback.print_exc()
+        with open_pdf(source) as doc:
+            return [read_page(page, mode) for page in doc]
+
+@timed("extract_pdf_text")
+def extract_pdf_text(source, mode=None, stats=None, parallel=True):
+    mode = mode or PDF_TEXT_MODE
+    pages = extract_pages(source, mode, parallel)
+    if mode != "layout":
+        return "".join(pages)
+    text = assemble_layout_text(pages)
+    if stats is not None:
+        # Same tokenizer as the extraction prompt budget (cv_preprocess), so the figures compare
+        raw_tokens = sum(p["raw_tokens"] for p in pages)
+        layout_tokens = count_tokens(text)
+        stats.update({
+            "pages": len(pages),
+            "raw_text_tokens": raw_tokens,
+            "layout_text_tokens": layout_tokens,
+            "saved_tokens": raw_tokens - layout_tokens
+        })
+    return text
+
+def extract_pdf_text_with_stats(pdf_bytes, mode=None):
+    # Entry point for pool workers (one whole PDF per task): no nested page-range pool
+    stats = {}
+    return extract_pdf_text(pdf_bytes, mode, stats, parallel=False), stats
@@ -0,0 +1,146 @@
+import os
+import time
+import queue
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# --- Pipeline progress events ---
+# The pipeline calls emit()/stage() wherever something worth reporting happens. Events go
+# to the channel bound to the current context (a job binds one with bind()); with nothing
+# bound, emit() is a ContextVar lookup and a None check, so unobserved runs (Streamlit,
+# scripts, batch) pay next to nothing. asyncio tasks inherit the binding; pipeline threads
+# only do when their work is submitted through contextvars.copy_context().run.
+#
+# Events are flat dicts: {"event": "stage", "stage": "extract", "state": "started", ...},
+# {"event": "translation", "lang": "EN", "done": 12, "total": 40},
+# {"event": "tokens", "prompt_tokens": ..., "completion_tokens": ...}.
+
+PROGRESS_HISTORY = int(os.getenv("PROGRESS_HISTORY", "500"))
+PROGRESS_TTL_SECONDS = int(os.getenv("PROGRESS_TTL_SECONDS", str(24 * 3600)))
+
+CURRENT_CHANNEL = ContextVar("progress_channel", default=None)
+
+class ProgressChannel:
+    def __init__(self, history=PROGRESS_HISTORY):
+        self.created_at = time.time()
+        self.closed = False
+        self._history = deque(maxlen=history)
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def publish(self, event):
+        with self._lock:
+            if self.closed:
+                return
+            self._history.append(event)
+            subscribers = tuple(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.put(event)
+
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            subscribers, self._subscribers = self._subscribers, []
+        for subscriber in subscribers:
+            subscriber.put(None)
+
+    def subscribe(self):
+        # Late subscribers get the recent history first; None marks the end of the stream
+        subscriber = queue.Queue()
+        with self._lock:
+            for event in self._history:
+                subscriber.put(event)
+            if self.closed:
+                subscriber.put(None)
+            else:
+                self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def listen(self, heartbeat=15.0):
+        # Yields events until the channel closes; None every `heartbeat` seconds of silence
+        subscriber = self.subscribe()
+        try:
+            while True:
+                try:
+                    event = subscriber.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield None
+                    continue
+                if event is None:
+                    return
+                yield event
+        finally:
+            self.unsubscribe(subscriber)
+
+class ProgressBroker:
+    # Channels by job id, for the process that runs (or accepted) the job
+    def __init__(self, ttl=PROGRESS_TTL_SECONDS):
+        self.ttl = ttl
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def open(self, key):
+        with self._lock:
+            self._prune(time.time())
+            channel = self._channels.get(key)
+            if channel is None:
+                channel = self._channels[key] = ProgressChannel()
+            return channel
+
+    def get(self, key):
+        return self._channels.get(key)
+
+    def discard(self, key):
+        with self._lock:
+            channel = self._channels.pop(key, None)
+        if channel is not None:
+            channel.close()
+
+    def _prune(self, now):
+        expired = [key for key, channel in self._channels.items() if now - channel.created_at > self.ttl]
+        for key in expired:
+            self._channels.pop(key).close()
+
+PROGRESS = ProgressBroker()
+
+@contextmanager
+def bind(channel):
+    token = CURRENT_CHANNEL.set(channel)
+    try:
+        yield channel
+    finally:
+        CURRENT_CHANNEL.reset(token)
+
+def listening():
+    return CURRENT_CHANNEL.get() is not None
+
+def emit(event, **fields):
+    channel = CURRENT_CHANNEL.get()
+    if channel is None:
+        return
+    fields["event"] = event
+    fields["at"] = round(time.time(), 3)
+    channel.publish(fields)
+
+@contextmanager
+def stage(name, **fields):
+    if CURRENT_CHANNEL.get() is None:
+        yield
+        return
+    started = time.monotonic()
+    emit("stage", stage=name, state="started", **fields)
+    try:
+        yield
+    except BaseException:
+        emit("stage", stage=name, state="failed", seconds=round(time.monotonic() - started, 3), **fields)
+        raise
+    emit("stage", stage=name, state="finished", seconds=round(time.monotonic() - started, 3), **fields)
@@ -0,0 +1,41 @@
+import time
+import asyncio
+import threading
+
+# --- Process-wide request rate limiting ---
+# Token bucket shared by every thread (and event loop) in the process. Callers reserve a
+# slot and sleep until it comes up, outside the lock, so a burst of batch jobs queues
+# up in arrival order instead of tripping the provider's rate limit.
+
+class RateLimiter:
+    def __init__(self, per_minute, burst=None):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.burst = max(1, burst if burst is not None else int(per_minute // 10) or 1)
+        self._next_free = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def reserve(self):
+        # Returns how long the caller has to wait for its slot
+        if not self.enabled:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            # Unused capacity accumulates up to `burst` requests
+            earliest = now - self.interval * (self.burst - 1)
+            slot = max(self._next_free, earliest)
+            self._next_free = slot + self.interval
+            return max(0.0, slot - now)
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
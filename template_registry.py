@@ -0,0 +1,130 @@
+import io
+import os
+import re
+import hashlib
+import zipfile
+import threading
+from jinja2 import Template
+from jinja2.exceptions import TemplateError
+from docxtpl import DocxTemplate
+
+# --- DOCX template registry ---
+# Each template file is loaded once per process: the patched XML of the body, headers and
+# footers is compiled to Jinja templates, the undeclared variables are computed, and the
+# package is re-zipped uncompressed in memory. A render then gets a fresh DocxTemplate
+# built from that copy (no inflate, no XML patching, no Jinja compile), so it only pays
+# for Jinja execution, the docxtpl post-processing and writing the output zip.
+#
+# Entries are revalidated with os.stat on every get(); a changed mtime/size triggers a
+# hash check and a recompile only when the content really changed.
+#
+# Relies on docxtpl 0.16.x internals (build_xml, build_headers_footers_xml,
+# render_xml_part), pinned in requirements.txt.
+
+PARAGRAPH_RE = re.compile(r"<w:p([ >])")
+SPLIT_PARAGRAPH_RE = re.compile(r"\n<w:p([ >])")
+
+def stored_copy(data):
+    # Same package with every member stored, so opening it per render is a memory copy
+    out = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as zin, zipfile.ZipFile(out, "w", zipfile.ZIP_STORED) as zout:
+        for item in zin.infolist():
+            zout.writestr(item.filename, zin.read(item.filename))
+    return out.getvalue()
+
+class CompiledTemplate:
+    def __init__(self, path, data, stat):
+        self.path = path
+        self.stat = stat
+        self.sha256 = hashlib.sha256(data).hexdigest()
+        self.package = stored_copy(data)
+
+        doc = DocxTemplate(io.BytesIO(self.package))
+        doc.init_docx()
+        self.body_xml = doc.patch_xml(doc.get_xml())
+        self.part_xml = {}
+        for uri in (DocxTemplate.HEADER_URI, DocxTemplate.FOOTER_URI):
+            for rel_key, part in doc.get_headers_footers(uri):
+                xml = doc.get_part_xml(part)
+                self.part_xml[rel_key] = (doc.patch_xml(xml), doc.get_headers_footers_encoding(xml))
+
+        # Keyed by the patched source string; the same string objects are passed back at
+        # render time, so the lookup is an identity comparison
+        sources = [self.body_xml] + [xml for xml, _ in self.part_xml.values()]
+        self.templates = {src: Template(PARAGRAPH_RE.sub(r"\n<w:p\1", src)) for src in sources}
+        self.undeclared_variables = frozenset(doc.get_undeclared_template_variables())
+
+    def new_document(self):
+        return PrecompiledDocxTemplate(self)
+
+class PrecompiledDocxTemplate(DocxTemplate):
+    def __init__(self, compiled):
+        super().__init__(io.BytesIO(compiled.package))
+        self.compiled = compiled
+
+    def build_xml(self, context, jinja_env=None):
+        return self.render_xml_part(self.compiled.body_xml, self.docx._part, context, jinja_env)
+
+    def build_headers_footers_xml(self, context, uri, jinja_env=None):
+        for rel_key, part in self.get_headers_footers(uri):
+            cached = self.compiled.part_xml.get(rel_key)
+            if cached is None:
+                xml = self.get_part_xml(part)
+                cached = (self.patch_xml(xml), self.get_headers_footers_encoding(xml))
+            xml, encoding = cached
+            yield rel_key, self.render_xml_part(xml, part, context, jinja_env).encode(encoding)
+
+    def render_xml_part(self, src_xml, part, context, jinja_env=None):
+        template = self.compiled.templates.get(src_xml) if jinja_env is None else None
+        if template is None:
+            return super().render_xml_part(src_xml, part, context, jinja_env)
+        self.current_rendering_part = part
+        try:
+            dst_xml = template.render(context)
+        except TemplateError:
+            # Re-run the stock path so the error carries docxtpl's docx_context lines
+            return super().render_xml_part(src_xml, part, context, jinja_env)
+        dst_xml = SPLIT_PARAGRAPH_RE.sub(r"<w:p\1", dst_xml)
+        dst_xml = (dst_xml
+                   .replace("{_{", "{{")
+                   .replace("}_}", "}}")
+                   .replace("{_%", "{%")
+                   .replace("%_}", "%}"))
+        return self.resolve_listing(dst_xml)
+
+class TemplateRegistry:
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        stat = (st.st_mtime_ns, st.st_size)
+        entry = self._entries.get(path)
+        if entry is not None and entry.stat == stat:
+            return entry
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.stat == stat:
+                return entry
+            with open(path, "rb") as f:
+                data = f.read()
+            if entry is not None and entry.sha256 == hashlib.sha256(data).hexdigest():
+                entry.stat = stat  # touched, not changed
+                return entry
+            entry = CompiledTemplate(path, data, stat)
+            self._entries[path] = entry
+            return entry
+
+    def undeclared_variables(self, path):
+        return self.get(path).undeclared_variables
+
+    def new_document(self, path):
+        return self.get(path).new_document()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+TEMPLATE_REGISTRY = TemplateRegistry()
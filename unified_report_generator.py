@@ -1,13 +1,32 @@
 import os
 import json
-import tempfile
+import asyncio
+import io
+import contextvars
+import threading
+import weakref
+import hashlib
+import unicodedata
+import importlib.util
+from types import MappingProxyType
+from functools import lru_cache
+import httpx
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
-from docxtpl import DocxTemplate
-import fitz  # PyMuPDF
-from openai import Client
+from openai import Client, AsyncClient, RateLimitError
 import traceback
-import pandas as pd
 import re
+from llm_cache import TieredCache, make_key, normalize_text
+from language_detection import is_in_language
+from language_levels import LevelTableProvider
+from rate_limit import RateLimiter
+from template_registry import TEMPLATE_REGISTRY
+import progress
+from metrics import REGISTRY, timed, openai_metrics_hooks, record_tokens
+from date_normalization import parse_month_year, split_job_dates, format_month_year, month_ordinal, format_month_ordinal
+from pdf_text import extract_pdf_text, PDF_TEXT_MODE
+from json_stream import IncrementalJSONParser, repair_json
+from cv_preprocess import preprocess_cv_text, split_into_chunks, count_tokens, CV_TOKEN_BUDGET, CV_CHUNK_TOKENS
 
 # --- MongoDB integration for company dropdown ---
 from pymongo import MongoClient
@@ -62,9 +81,117 @@ Output only valid JSON matching the provided schema.
 ... (unchanged, rest of prompt) ...
 """
 
+# Layout-mode text already arrives column by column, so the column re-ordering rule is dropped
+LAYOUT_EXTRACTION_PROMPT = "\n".join(
+    line for line in EXTRACTION_PROMPT.split("\n") if not line.startswith("- For more than one column")
+)
+
+def extraction_prompt_for_mode(mode=None):
+    return LAYOUT_EXTRACTION_PROMPT if (mode or PDF_TEXT_MODE) == "layout" else EXTRACTION_PROMPT
+
 UPLOAD_FOLDER = 'uploads'
 TEMPLATE_FOLDER = 'template'
 STATIC_FOLDER = 'static'
+CACHE_FOLDER = os.getenv("CACHE_FOLDER", "cache")
+
+# --- Shared OpenAI clients ---
+# One pooled client per process (and one async client per event loop) so extraction and
+# the translation calls reuse warm keep-alive connections instead of a new pool per call.
+
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "32"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "16"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+# HTTP/2 needs the optional "h2" package
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "1") != "0" and importlib.util.find_spec("h2") is not None
+# Process-wide cap on OpenAI HTTP requests (retries included); 0 disables it. Applied as
+# an httpx request hook, so every extraction/translation call from any thread shares it.
+OPENAI_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "0"))
+OPENAI_RATE_LIMITER = RateLimiter(OPENAI_REQUESTS_PER_MINUTE, int(os.getenv("OPENAI_REQUESTS_BURST", "0")) or None)
+
+_openai_client = None
+_openai_async_clients = weakref.WeakKeyDictionary()
+_openai_client_lock = threading.Lock()
+_async_loop = None
+
+def openai_rate_limit_hooks(is_async=False):
+    if not OPENAI_RATE_LIMITER.enabled:
+        return []
+    if is_async:
+        async def wait_for_slot(request):
+            await OPENAI_RATE_LIMITER.acquire_async()
+    else:
+        def wait_for_slot(request):
+            OPENAI_RATE_LIMITER.acquire()
+    return [wait_for_slot]
+
+def openai_event_hooks(is_async=False):
+    # Rate limit first, so request latency metrics exclude the wait for a slot
+    metrics_hooks = openai_metrics_hooks(is_async)
+    hooks = {
+        "request": openai_rate_limit_hooks(is_async) + metrics_hooks.get("request", []),
+        "response": metrics_hooks.get("response", []),
+    }
+    return {"event_hooks": hooks} if hooks["request"] or hooks["response"] else {}
+
+def openai_http_options(is_async=False):
+    return {
+        **openai_event_hooks(is_async),
+        "http2": OPENAI_HTTP2,
+        "limits": httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY
+        ),
+        "timeout": httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT)
+    }
+
+def get_openai_client():
+    global _openai_client
+    if _openai_client is None:
+        with _openai_client_lock:
+            if _openai_client is None:
+                _openai_client = Client(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    http_client=httpx.Client(**openai_http_options()),
+                    max_retries=OPENAI_MAX_RETRIES,
+                    timeout=OPENAI_TIMEOUT
+                )
+    return _openai_client
+
+# Async translation runs on one long-lived loop in a daemon thread, so the loop's single
+# AsyncClient keeps its warm connections across calls from every thread. asyncio.run per
+# call would build a new client and pool each time and leave them open.
+def get_async_loop():
+    global _async_loop
+    if _async_loop is None:
+        with _openai_client_lock:
+            if _async_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="openai-async-loop", daemon=True).start()
+                _async_loop = loop
+    return _async_loop
+
+def run_async(coroutine):
+    # The task starts in a copy of the caller's context, so progress channels and metric
+    # stages bound by the caller still apply
+    return asyncio.run_coroutine_threadsafe(coroutine, get_async_loop()).result()
+
+def get_async_openai_client():
+    # httpx async pools are bound to the event loop that created them
+    loop = asyncio.get_running_loop()
+    client = _openai_async_clients.get(loop)
+    if client is None:
+        client = AsyncClient(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=httpx.AsyncClient(**openai_http_options(is_async=True)),
+            max_retries=OPENAI_MAX_RETRIES,
+            timeout=OPENAI_TIMEOUT
+        )
+        _openai_async_clients[loop] = client
+    return client
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(TEMPLATE_FOLDER, exist_ok=True)
@@ -121,6 +248,9 @@ REQUIRED_SCHEMA = {
     }]
 }
 
+# Compact form of the schema for the prompt: the model does not need the indentation
+SCHEMA_EXAMPLE = json.dumps(REQUIRED_SCHEMA, ensure_ascii=False, separators=(",", ":"))
+
 def smart_title(text):
     if not isinstance(text, str):
         return text
@@ -197,24 +327,19 @@ def enforce_schema(data, schema):
         return data if data is not None else schema
 
 SHEET_URL = "https://docs.google.com/spreadsheets/d/1q8hKLWcizUK2moUxQpiLHCyB5FHYVpPPNiyvq0NB_mM/export?format=csv"
-df_levels = pd.read_csv(SHEET_URL)
-df_levels["language_level"] = df_levels["language_level"].astype(str)
-
-PT_LEVELS = {}
-EN_LEVELS = {}
-for _, row in df_levels.iterrows():
-    pt_title = str(row.get("language_level_title_pt", "")).strip().lower()
-    en_title = str(row.get("language_level_title_en", "")).strip().lower()
-    if pt_title:
-        PT_LEVELS[pt_title] = {
-            "language_level": row.get("language_level_title_pt", ""),
-            "level_description": row.get("level_description_pt", "")
-        }
-    if en_title:
-        EN_LEVELS[en_title] = {
-            "language_level": row.get("language_level_title_en", ""),
-            "level_description": row.get("level_description_en", "")
-        }
+LEVEL_TABLE_PROVIDER = LevelTableProvider(
+    SHEET_URL,
+    snapshot_path=os.path.join(CACHE_FOLDER, "language_levels.csv"),
+    bundled_path=os.path.join(TEMPLATE_FOLDER, "language_levels.csv"),
+    ttl=int(os.getenv("LANGUAGE_LEVELS_TTL", str(6 * 3600)))
+)
+
+# Without a local copy the provider already fetched in its constructor; otherwise kick off
+# the background refresh now so a stale snapshot is updated before the first request
+LEVEL_TABLE_PROVIDER.refresh_if_stale()
+
+def level_table():
+    return LEVEL_TABLE_PROVIDER.table()
 
 CANONICAL_LANGUAGE_LEVELS = [
     {
@@ -244,11 +369,12 @@ CANONICAL_LANGUAGE_LEVELS = [
     },
 ]
 
-def canonicalize_language_level(raw_level, report_lang):
-    if not isinstance(raw_level, str):
-        return ""
-    raw_level = raw_level.strip().lower()
-    lang_key = "pt" if report_lang.upper() == "PT" else "en"
+# Level strings repeat a lot across CVs and report languages, so the table scan is
+# memoized on the normalized input
+MATCH_MEMO_SIZE = int(os.getenv("MATCH_MEMO_SIZE", "4096"))
+
+@lru_cache(maxsize=MATCH_MEMO_SIZE)
+def _canonical_level(raw_level, lang_key):
     for lvl in CANONICAL_LANGUAGE_LEVELS:
         if raw_level == lvl[lang_key].lower():
             return lvl[lang_key]
@@ -257,137 +383,397 @@ def canonicalize_language_level(raw_level, report_lang):
                 return lvl[lang_key]
     return ""
 
+def canonicalize_language_level(raw_level, report_lang):
+    if not isinstance(raw_level, str):
+        return ""
+    lang_key = "pt" if report_lang.upper() == "PT" else "en"
+    return _canonical_level(raw_level.strip().lower(), lang_key)
+
 def find_level_entry(level_value, report_lang):
     if not level_value:
         return None
-    key = str(level_value).strip().lower()
-    if report_lang.upper() == "PT":
-        if key in PT_LEVELS:
-            return PT_LEVELS[key]
-        for k in PT_LEVELS:
-            if key in k or k in key:
-                return PT_LEVELS[k]
-    else:
-        if key in EN_LEVELS:
-            return EN_LEVELS[key]
-        for k in EN_LEVELS:
-            if key in k or k in key:
-                return ENLEVELS[k]
-    return None
+    return level_table().find(level_value, report_lang)
 
 PRESENT_TERMS_EN = ["present", "current", "currently", "actual", "nowadays", "this moment", "today"]
 PRESENT_TERMS_PT = ["presente", "atual", "atualmente", "no presente", "neste momento", "data atual", "presente momento", "agora"]
 
-def is_present_term(end_str, report_lang):
+PRESENT_TERMS_ANY = tuple(PRESENT_TERMS_PT + PRESENT_TERMS_EN)
+
+@lru_cache(maxsize=MATCH_MEMO_SIZE)
+def _contains_present_term(term):
+    return any(term == t or t in term for t in PRESENT_TERMS_ANY)
+
+def is_present_term_any(end_str, report_lang):
+    # Extraction is language neutral, so dates may still use the CV's own language
     if not isinstance(end_str, str):
         return False
-    term = end_str.strip().lower()
-    if report_lang.upper() == "PT":
-        return any(term == t or t in term for t in PRESENT_TERMS_PT)
-    else:
-        return any(term == t or t in term for t in PRESENT_TERMS_EN)
-
-MONTHS_EN = {
-    "january": "01", "february": "02", "march": "03", "april": "04", "may": "05", "june": "06",
-    "july": "07", "august": "08", "september": "09", "october": "10", "november": "11", "december": "12",
-    "jan": "01", "feb": "02", "mar": "03", "apr": "04", "may": "05", "jun": "06",
-    "jul": "07", "aug": "08", "sep": "09", "oct": "10", "nov": "11", "dec": "12"
-}
-MONTHS_PT = {
-    "janeiro": "01", "fevereiro": "02", "março": "03", "marco": "03", "abril": "04", "maio": "05", "junho": "06",
-    "julho": "07", "agosto": "08", "setembro": "09", "outubro": "10", "novembro": "11", "dezembro": "12",
-    "jan": "01", "fev": "02", "mar": "03", "abr": "04", "mai": "05", "jun": "06",
-    "jul": "07", "ago": "08", "set": "09", "out": "10", "nov": "11", "dez": "12"
-}
+    return _contains_present_term(end_str.strip().lower())
 
-def normalize_to_mm_yyyy(date_str, report_lang):
+def normalize_to_mm_yyyy(date_str, report_lang=None):
     if not isinstance(date_str, str):
         return date_str
-    s = date_str.strip().lower()
-    if valid_mm_yyyy(s):
-        return s
-    match = re.match(r"([a-zçãéíôúàõ]+)\s+(\d{4})", s)
-    if match:
-        month_name, year = match.groups()
-        if report_lang.upper() == "PT":
-            month_num = MONTHS_PT.get(month_name)
-        else:
-            month_num = MONTHS_EN.get(month_name)
-        if month_num:
-            return f"{month_num}/{year}"
-    match = re.match(r"(\d{4})", s)
-    if match:
-        return f"01/{match.group(1)}"
-    return date_str
-
-def valid_mm_yyyy(date_str):
-    if isinstance(date_str, str) and len(date_str) == 7 and date_str[2] == "/":
-        mm, yyyy = date_str[:2], date_str[3:]
-        return mm.isdigit() and yyyy.isdigit() and 1 <= int(mm) <= 12
-    return False
-
-def parse_mm_yyyy(date_str):
-    try:
-        return datetime.strptime(date_str, "%m/%Y")
-    except Exception:
+    year_month = parse_month_year(date_str)
+    return format_month_year(year_month) if year_month else date_str
+
+TRANSLATION_MODEL = "gpt-3.5-turbo"
+TRANSLATION_MODE = os.getenv("TRANSLATION_MODE", "batch").lower()
+TRANSLATION_BATCH_MAX_CHARS = int(os.getenv("TRANSLATION_BATCH_MAX_CHARS", "6000"))
+TRANSLATION_BATCH_MAX_ITEMS = int(os.getenv("TRANSLATION_BATCH_MAX_ITEMS", "60"))
+TRANSLATION_CONCURRENCY = int(os.getenv("TRANSLATION_CONCURRENCY", "8"))
+TRANSLATION_MAX_RETRIES = int(os.getenv("TRANSLATION_MAX_RETRIES", "4"))
+
+# Bump when the translation prompts change so cached translations are not reused
+TRANSLATION_PROMPT_VERSION = "1"
+TRANSLATION_CACHE = TieredCache(
+    "translations",
+    path=os.path.join(CACHE_FOLDER, "llm_cache.sqlite3") if os.getenv("TRANSLATION_CACHE", "1") != "0" else None,
+    memory_entries=int(os.getenv("TRANSLATION_CACHE_MEMORY_ENTRIES", "4096")),
+    disk_entries=int(os.getenv("TRANSLATION_CACHE_DISK_ENTRIES", "200000")),
+    max_age=int(os.getenv("TRANSLATION_CACHE_MAX_AGE", str(90 * 24 * 3600)))
+)
+
+def translation_cache_key(text, target_lang):
+    return make_key(normalize_text(text), target_lang.upper(), TRANSLATION_MODEL, TRANSLATION_PROMPT_VERSION)
+
+# Per-report translation counters; callers pass a dict from new_translation_stats()
+def new_translation_stats():
+    return {"leaves": 0, "already_in_target_lang": 0, "cache_hits": 0, "sent_to_llm": 0, "fallback_calls": 0}
+
+_translation_stats_lock = threading.Lock()
+
+def count_stat(stats, name, amount=1):
+    # Locked: the streaming prefetch counts into the same dict from several threads
+    if stats is not None:
+        with _translation_stats_lock:
+            stats[name] = stats.get(name, 0) + amount
+
+TRANSLATION_SKIP_KEYS = frozenset({
+    "language_level", "level_description", "report_lang", "report_date", "company_title", "cdd_name", "last_company",
+    "cdd_email", "cdd_cel", "cdd_ddd", "cdd_ddi", "cdd_age", "cdd_state", "cdd_city", "cdd_company", "language",
+    "company_start_date", "company_end_date", "start_date", "end_date", "academic_conclusion", "academic_institution"
+})
+
+def translation_prompts(target_lang):
+    if target_lang.upper() == "EN":
+        system_prompt = "You are a translation assistant. Translate ONLY to English. Never use Spanish or any language but English."
+        prompt = "Translate the following text to English. Never use Spanish or any language but English:\n\n"
+    else:
+        system_prompt = "Você é um assistente de tradução. Traduza SOMENTE para o português. Nunca use espanhol nem outro idioma além de português."
+        prompt = "Traduza o texto abaixo para o português. Nunca use espanhol nem outro idioma além de português:\n\n"
+    return system_prompt, prompt
+
+def clean_translation(result, text):
+    if not isinstance(result, str):
+        return None
+    result = result.strip()
+    lowered = result.lower()
+    if not result or lowered.startswith("i'm sorry") or lowered.startswith("sorry") or lowered.startswith("as an") or lowered.startswith("as a") or "could stand for man" in lowered:
         return None
+    if result == text.strip():
+        return text
+    return result
 
-def translate_text(text, target_lang="EN"):
+@timed("translate_text")
+def translate_text(text, target_lang="EN", stats=None):
     if not isinstance(text, str) or not text.strip():
         return text
     if target_lang.upper() not in ("EN", "PT"):
         return text
+    count_stat(stats, "leaves")
+    if is_in_language(text, target_lang):
+        count_stat(stats, "already_in_target_lang")
+        return text
+    cache_key = translation_cache_key(text, target_lang)
+    cached = TRANSLATION_CACHE.get(cache_key)
+    if cached is not None:
+        count_stat(stats, "cache_hits")
+        return cached
+    count_stat(stats, "sent_to_llm")
     try:
-        client = Client(api_key=os.getenv("OPENAI_API_KEY"))
-        if target_lang.upper() == "EN":
-            system_prompt = "You are a translation assistant. Translate ONLY to English. Never use Spanish or any language but English."
-            prompt = f"Translate the following text to English. Never use Spanish or any language but English:\n\n{text.strip()}"
-        else:
-            system_prompt = "Você é um assistente de tradução. Traduza SOMENTE para o português. Nunca use espanhol nem outro idioma além de português."
-            prompt = f"Traduza o texto abaixo para o português. Nunca use espanhol nem outro idioma além de português:\n\n{text.strip()}"
+        client = get_openai_client()
+        system_prompt, prompt = translation_prompts(target_lang)
         response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
+            model=TRANSLATION_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
+                {"role": "user", "content": prompt + text.strip()}
             ],
             temperature=0.2
         )
-        result = response.choices[0].message.content.strip()
-        if not result or result.lower().startswith("i'm sorry") or result.lower().startswith("sorry") or result.lower().startswith("as an") or  result.lower().startswith("as a") or "could stand for man" in result.lower():
-            return text
-        if result.strip() == text.strip():
+        result = clean_translation(response.choices[0].message.content, text)
+        if result is None:
             return text
+        TRANSLATION_CACHE.set(cache_key, result)
         return result
     except Exception:
         return text
 
-def translate_json_values(data, target_lang="EN", skip_keys=None):
-    default_skip = {
-        "language_level", "level_description", "report_lang", "report_date", "company_title", "cdd_name", "last_company",
-        "cdd_email", "cdd_cel", "cdd_ddd", "cdd_ddi", "cdd_age", "cdd_state", "cdd_city", "cdd_company","language"
-        "company_start_date", "company_end_date", "start_date", "end_date", "academic_conclusion", "academic_institution"
-    }
+def resolve_skip_keys(skip_keys=None):
     if skip_keys is None:
-        skip_keys = default_skip
-    else:
-        skip_keys = set(skip_keys) | default_skip
+        return TRANSLATION_SKIP_KEYS
+    return set(skip_keys) | TRANSLATION_SKIP_KEYS
+
+def translate_json_values(data, target_lang="EN", skip_keys=None, stats=None):
+    skip_keys = resolve_skip_keys(skip_keys)
+    if progress.listening():
+        return translate_json_leaves(data, target_lang, skip_keys, stats)
     if isinstance(data, dict):
-        return {k: translate_json_values(v, target_lang, skip_keys) if k not in skip_keys else v for k, v in data.items()}
+        return {k: translate_json_values(v, target_lang, skip_keys, stats) if k not in skip_keys else v for k, v in data.items()}
     elif isinstance(data, list):
-        return [translate_json_values(item, target_lang, skip_keys) for item in data]
+        return [translate_json_values(item, target_lang, skip_keys, stats) for item in data]
     elif isinstance(data, str):
-        return translate_text(data, target_lang)
+        return translate_text(data, target_lang, stats)
     else:
         return data
 
+# Same result as translate_json_values, walked leaf by leaf so progress can report done/total
+def translate_json_leaves(data, target_lang, skip_keys, stats=None):
+    leaves = collect_translatable_leaves(data, skip_keys)
+    if not leaves:
+        return data
+    result = copy_json_tree(data)
+    for done, (path, text) in enumerate(leaves, start=1):
+        set_by_path(result, path, translate_text(text, target_lang, stats))
+        progress.emit("translation", lang=target_lang.upper(), done=done, total=len(leaves))
+    return result
+
+# --- Batched translation ---
+# All translatable leaves are sent in a few size-bounded requests keyed by JSON path
+# ("line_items.0.job_posts.1.job_tasks.2.task") and written back by path.
+
+BATCH_TRANSLATION_INSTRUCTIONS = {
+    "EN": (
+        "You receive a JSON object whose values are texts from a resume. "
+        "Translate every value to English. Never use Spanish or any language but English. "
+        "Keep every key exactly as given and return only a JSON object with the same keys."
+    ),
+    "PT": (
+        "Você recebe um objeto JSON cujos valores são textos de um currículo. "
+        "Traduza todos os valores para o português. Nunca use espanhol nem outro idioma além de português. "
+        "Mantenha todas as chaves exatamente como recebidas e retorne somente um objeto JSON com as mesmas chaves."
+    ),
+}
+
+def path_to_key(path):
+    return ".".join(str(p) for p in path)
+
+def collect_translatable_leaves(data, skip_keys, path=()):
+    leaves = []
+    if isinstance(data, dict):
+        for k, v in data.items():
+            if k not in skip_keys:
+                leaves.extend(collect_translatable_leaves(v, skip_keys, path + (k,)))
+    elif isinstance(data, list):
+        for i, item in enumerate(data):
+            leaves.extend(collect_translatable_leaves(item, skip_keys, path + (i,)))
+    elif isinstance(data, str) and data.strip():
+        leaves.append((path, data))
+    return leaves
+
+def copy_json_tree(data):
+    if isinstance(data, dict):
+        return {k: copy_json_tree(v) for k, v in data.items()}
+    elif isinstance(data, list):
+        return [copy_json_tree(item) for item in data]
+    return data
+
+def set_by_path(data, path, value):
+    target = data
+    for p in path[:-1]:
+        target = target[p]
+    target[path[-1]] = value
+
+def chunk_leaves(leaves, max_chars=TRANSLATION_BATCH_MAX_CHARS, max_items=TRANSLATION_BATCH_MAX_ITEMS):
+    batch, size = [], 0
+    for leaf in leaves:
+        leaf_size = len(leaf[1])
+        if batch and (size + leaf_size > max_chars or len(batch) >= max_items):
+            yield batch
+            batch, size = [], 0
+        batch.append(leaf)
+        size += leaf_size
+    if batch:
+        yield batch
+
+@timed("translate_batch")
+def translate_batch(batch, target_lang, client):
+    payload = {path_to_key(path): text.strip() for path, text in batch}
+    try:
+        response = client.chat.completions.create(
+            model=TRANSLATION_MODEL,
+            messages=[
+                {"role": "system", "content": BATCH_TRANSLATION_INSTRUCTIONS[target_lang.upper()]},
+                {"role": "user", "content": json.dumps(payload, ensure_ascii=False)}
+            ],
+            temperature=0.2,
+            **json_response_options()
+        )
+        # No re-ask here: leaves missing from the batch already fall back to single calls
+        translated, _ = parse_model_json(response.choices[0].message.content, track=False)
+    except Exception:
+        traceback.print_exc()
+        return None
+    if not isinstance(translated, dict):
+        return None
+    results = {}
+    for path, text in batch:
+        result = clean_translation(translated.get(path_to_key(path)), text)
+        if result is not None:
+            results[path] = result
+            TRANSLATION_CACHE.set(translation_cache_key(text, target_lang), result)
+    return results
+
+def translate_json_values_batched(data, target_lang="EN", skip_keys=None, stats=None):
+    if target_lang.upper() not in ("EN", "PT"):
+        return data
+    skip_keys = resolve_skip_keys(skip_keys)
+    leaves = collect_translatable_leaves(data, skip_keys)
+    if not leaves:
+        return data
+    result = copy_json_tree(data)
+    pending = []
+    for path, text in leaves:
+        count_stat(stats, "leaves")
+        if is_in_language(text, target_lang):
+            count_stat(stats, "already_in_target_lang")
+            continue
+        cached = TRANSLATION_CACHE.get(translation_cache_key(text, target_lang))
+        if cached is not None:
+            count_stat(stats, "cache_hits")
+            set_by_path(result, path, cached)
+        else:
+            pending.append((path, text))
+    done = len(leaves) - len(pending)
+    progress.emit("translation", lang=target_lang.upper(), done=done, total=len(leaves))
+    if not pending:
+        return result
+    count_stat(stats, "sent_to_llm", len(pending))
+    client = get_openai_client()
+    # Fallback calls count their cache hits and LLM calls, not the leaves again
+    fallback_stats = new_translation_stats() if stats is not None else None
+    for batch in chunk_leaves(pending):
+        translated = translate_batch(batch, target_lang, client)
+        if translated is None:
+            # The whole request failed (timeout, 5xx, unparseable): retry it once before
+            # sending every leaf of the chunk on its own
+            translated = translate_batch(batch, target_lang, client) or {}
+        for path, text in batch:
+            if path in translated:
+                set_by_path(result, path, translated[path])
+            else:
+                # Leaf dropped or mangled by the batch response: fall back to a single call
+                count_stat(stats, "fallback_calls")
+                set_by_path(result, path, translate_text(text, target_lang, fallback_stats))
+        done += len(batch)
+        progress.emit("translation", lang=target_lang.upper(), done=done, total=len(leaves))
+    if fallback_stats is not None:
+        count_stat(stats, "cache_hits", fallback_stats["cache_hits"])
+        count_stat(stats, "sent_to_llm", fallback_stats["sent_to_llm"])
+    return result
+
+# --- Concurrent (asyncio) translation ---
+
+def retry_after_seconds(error, attempt):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return min(2 ** attempt, 30)
+
+@timed("translate_text_async")
+async def translate_text_async(text, target_lang, client, semaphore, stats=None):
+    if not isinstance(text, str) or not text.strip():
+        return text
+    if target_lang.upper() not in ("EN", "PT"):
+        return text
+    count_stat(stats, "leaves")
+    if is_in_language(text, target_lang):
+        count_stat(stats, "already_in_target_lang")
+        return text
+    cache_key = translation_cache_key(text, target_lang)
+    cached = TRANSLATION_CACHE.get(cache_key)
+    if cached is not None:
+        count_stat(stats, "cache_hits")
+        return cached
+    count_stat(stats, "sent_to_llm")
+    system_prompt, prompt = translation_prompts(target_lang)
+    for attempt in range(TRANSLATION_MAX_RETRIES + 1):
+        try:
+            async with semaphore:
+                response = await client.chat.completions.create(
+                    model=TRANSLATION_MODEL,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": prompt + text.strip()}
+                    ],
+                    temperature=0.2
+                )
+            result = clean_translation(response.choices[0].message.content, text)
+            if result is None:
+                return text
+            TRANSLATION_CACHE.set(cache_key, result)
+            return result
+        except RateLimitError as e:
+            if attempt == TRANSLATION_MAX_RETRIES:
+                return text
+            # Sleep outside the semaphore so other leaves keep their slots
+            await asyncio.sleep(retry_after_seconds(e, attempt))
+        except Exception:
+            return text
+    return text
+
+async def track_translation(coroutine, target_lang, done, total):
+    result = await coroutine
+    done[0] += 1
+    progress.emit("translation", lang=target_lang.upper(), done=done[0], total=total)
+    return result
+
+async def translate_json_values_async(data, target_lang="EN", skip_keys=None, concurrency=None, stats=None):
+    if target_lang.upper() not in ("EN", "PT"):
+        return data
+    skip_keys = resolve_skip_keys(skip_keys)
+    leaves = collect_translatable_leaves(data, skip_keys)
+    if not leaves:
+        return data
+    semaphore = asyncio.Semaphore(concurrency or TRANSLATION_CONCURRENCY)
+    # Retries are handled here so rate limits can honour retry-after without holding a slot
+    client = get_async_openai_client().with_options(max_retries=0)
+    coroutines = [translate_text_async(text, target_lang, client, semaphore, stats) for _, text in leaves]
+    if progress.listening():
+        done = [0]
+        coroutines = [track_translation(coroutine, target_lang, done, len(leaves)) for coroutine in coroutines]
+    translations = await asyncio.gather(*coroutines)
+    result = copy_json_tree(data)
+    for (path, _), translated in zip(leaves, translations):
+        set_by_path(result, path, translated)
+    return result
+
+@timed("translate_record")
+def translate_record(data, target_lang="EN", skip_keys=None, stats=None):
+    if TRANSLATION_MODE == "batch":
+        return translate_json_values_batched(data, target_lang, skip_keys, stats)
+    if TRANSLATION_MODE == "async":
+        return run_async(translate_json_values_async(data, target_lang, skip_keys, stats=stats))
+    return translate_json_values(data, target_lang, skip_keys, stats)
+
 def run_streamlit():
     import streamlit as st
     st.set_page_config(page_title="Gerador de Relatórios", layout="centered")
     st.title("📄 Gerador de Relatórios de Candidatos")
 
-    uploaded_file = st.file_uploader("📎 Faça upload do currículo (PDF)", type=["pdf"])
-    language = st.selectbox("🌐 Idioma do relatório", options=["PT", "EN"])
+    batch_mode = st.radio("📚 Modo", options=["Um currículo", "Lote (vários PDFs ou .zip)"], horizontal=True) != "Um currículo"
+    if batch_mode:
+        uploaded_files = st.file_uploader("📎 Faça upload dos currículos (PDFs ou um .zip)", type=["pdf", "zip"], accept_multiple_files=True)
+        uploaded_file = None
+    else:
+        uploaded_file = st.file_uploader("📎 Faça upload do currículo (PDF)", type=["pdf"])
+    language_option = st.selectbox("🌐 Idioma do relatório", options=["PT", "EN", "PT + EN"])
+    report_langs = ["PT", "EN"] if language_option == "PT + EN" else [language_option]
+    language = report_langs[0]
 
     # --- Company dropdown with hardcoded list ---
     company_names = [
@@ -455,7 +841,9 @@ def run_streamlit():
 
     # --- Language skill fields (form) ---
     st.markdown("#### Idiomas e Nível do Candidato")
-    dropdown_levels = list(df_levels["language_level"])
+    dropdown_levels = list(level_table().level_ids)
+    if not dropdown_levels:
+        st.warning("⚠️ Tabela de níveis de idioma indisponível: a planilha não pôde ser carregada e não há cópia local.")
     LANGUAGE_DISPLAY = [
         {"label_pt": "Inglês", "label_en": "English", "key": "english"},
         {"label_pt": "Espanhol", "label_en": "Spanish", "key": "spanish"},
@@ -476,284 +864,701 @@ def run_streamlit():
             )
             language_skills[lang["key"]] = level
 
-    if st.button("▶️ Gerar Relatório") and uploaded_file and company and company_title:
+    if batch_mode:
+        if st.button("▶️ Gerar Relatórios do Lote") and uploaded_files and company and company_title:
+            from batch_reports import read_batch_inputs, run_batch
+            try:
+                files = read_batch_inputs([(f.name, f.getbuffer()) for f in uploaded_files])
+            except Exception as e:
+                st.error(f"❌ Não foi possível ler os arquivos do lote: {e}")
+                st.stop()
+            if not files:
+                st.error("❌ Nenhum PDF encontrado nos arquivos enviados.")
+                st.stop()
+            progress_bar = st.progress(0.0, text=f"0 de {len(files)} currículos processados")
+
+            def show_progress(done, total, entry):
+                status = "✅" if entry["status"] == "ok" else "❌"
+                progress_bar.progress(done / total, text=f"{done} de {total} currículos processados ({status} {entry['file']})")
+
+            with st.spinner("Processando o lote..."):
+                zip_file, summary = run_batch(files, report_langs, company=company, company_title=company_title, language_skills=language_skills, on_progress=show_progress)
+            # download_button keeps its own copy of the bytes, so the temp file is not needed after this
+            with zip_file:
+                zip_bytes = zip_file.read()
+            st.success(f"Lote concluído: {summary['ok']} relatórios gerados, {summary['failed']} com erro.")
+            st.dataframe([
+                {"arquivo": e["file"], "status": e["status"], "relatórios": ", ".join(e["reports"]), "erro": e.get("error", "")}
+                for e in summary["files"]
+            ])
+            st.download_button(
+                label="📥 Baixar Relatórios (.zip)",
+                data=zip_bytes,
+                file_name=f"Relatorios_{datetime.today().strftime('%Y%m%d_%H%M%S')}.zip",
+                mime="application/zip",
+                key="download_batch"
+            )
+        elif not uploaded_files:
+            st.info("Por favor, preencha todos os campos e faça o upload dos PDFs ou do .zip.")
+    elif st.button("▶️ Gerar Relatório") and uploaded_file and company and company_title:
+        st.session_state["generated_reports"] = []
         with st.spinner("Processando o currículo e gerando relatório..."):
-            file_bytes = uploaded_file.read()
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf:
-                tmp_pdf.write(file_bytes)
-                tmp_pdf.flush()
-                tmp_pdf_path = tmp_pdf.name
+            translation_stats = new_translation_stats()
+            extraction_stats = {}
+            live_box = st.empty()
+            partial_data = {}
+
+            def show_partial(event):
+                # Fill in the extracted data progressively while the model is still answering
+                if event[0] == "field":
+                    partial_data[event[1]] = event[2]
+                else:
+                    partial_data.setdefault(event[1], []).append(event[3])
+                live_box.json(partial_data)
+
+            results = parse_cv_bytes_multi(uploaded_file.getbuffer(), report_langs, company_title=company_title, language_skills=language_skills, translation_stats=translation_stats, extraction_stats=extraction_stats, on_event=show_partial)
+            live_box.empty()
+
+            if "saved_tokens" in extraction_stats:
+                st.caption(
+                    f"📑 Texto do PDF: {extraction_stats['pages']} páginas, "
+                    f"~{extraction_stats['layout_text_tokens']} tokens "
+                    f"(economia de ~{extraction_stats['saved_tokens']} tokens com a leitura por layout)"
+                )
+            if "prompt_tokens" in extraction_stats:
+                dropped = ", ".join(extraction_stats["dropped_sections"]) or "nenhuma"
+                st.caption(
+                    f"🧮 Prompt de extração: {extraction_stats['prompt_tokens']} tokens "
+                    f"(seções removidas: {dropped})"
+                )
 
-            json_data = parse_cv_to_json(tmp_pdf_path, language, company_title=company_title, language_skills=language_skills)
-            try:
-                os.remove(tmp_pdf_path)
-            except Exception:
-                pass
+            st.caption(
+                f"🌐 Traduções: {translation_stats['leaves']} textos, "
+                f"{translation_stats['already_in_target_lang']} já no idioma do relatório, "
+                f"{translation_stats['cache_hits']} do cache, "
+                f"{translation_stats['sent_to_llm']} enviados ao modelo"
+            )
 
-            st.subheader("🔎 Dados extraídos do currículo:")
-            st.json(json_data)
-            if "error" in json_data:
+            if "error" in results:
+                st.subheader("🔎 Dados extraídos do currículo:")
+                st.json(results)
                 st.error("❌ Erro retornado pelo parser:")
                 st.stop()
 
-            json_data["company"] = company
+            for language in report_langs:
+                json_data = results[language]
+                st.subheader(f"🔎 Dados extraídos do currículo ({language}):")
+                st.json(json_data)
 
-            template_path = os.path.join(TEMPLATE_FOLDER, f"Template_Placeholders_{language}.docx")
-            safe_name = json_data.get('cdd_name', 'candidato').lower().replace(" ", "_")
-            output_filename = f"Relatorio_{safe_name}_{datetime.today().strftime('%Y%m%d')}.docx"
-            output_path = os.path.join(tempfile.gettempdir(), output_filename)
+                json_data["company"] = company
 
-            st.info(f"📄 Caminho do template utilizado: `{template_path}`")
-            if not os.path.isfile(template_path):
-                st.error(f"❌ Template file does not exist: {template_path}")
-                st.stop()
-            try:
-                with open(template_path, "rb") as f:
-                    header = f.read(4)
-                st.info(f"📄 Primeiros bytes do template: {header}")
-                if header != b'PK\x03\x04':
-                    st.error("❌ Template file is not a valid DOCX (ZIP format).")
+                template_path = template_path_for(language)
+                output_filename = report_filename(json_data, language, len(report_langs) > 1)
+
+                st.info(f"📄 Caminho do template utilizado: `{template_path}`")
+                if not os.path.isfile(template_path):
+                    st.error(f"❌ Template file does not exist: {template_path}")
                     st.stop()
-                st.info(f"📄 Tamanho do arquivo template: {os.path.getsize(template_path)} bytes")
                 try:
-                    doc = DocxTemplate(template_path)
-                    undeclared = doc.get_undeclared_template_variables()
-                    if undeclared:
-                        st.warning(f"⚠️ Template placeholders not provided in context: {undeclared}")
+                    with open(template_path, "rb") as f:
+                        header = f.read(4)
+                    st.info(f"📄 Primeiros bytes do template: {header}")
+                    if header != b'PK\x03\x04':
+                        st.error("❌ Template file is not a valid DOCX (ZIP format).")
+                        st.stop()
+                    st.info(f"📄 Tamanho do arquivo template: {os.path.getsize(template_path)} bytes")
+                    try:
+                        undeclared = set(TEMPLATE_REGISTRY.undeclared_variables(template_path))
+                        if undeclared:
+                            st.warning(f"⚠️ Template placeholders not provided in context: {undeclared}")
+                    except Exception as e:
+                        st.warning(f"⚠️ Não foi possível checar placeholders do template: {e}")
                 except Exception as e:
-                    st.warning(f"⚠️ Não foi possível checar placeholders do template: {e}")
-            except Exception as e:
-                st.error(f"❌ Could not read template file: {e}")
-                st.stop()
+                    st.error(f"❌ Could not read template file: {e}")
+                    st.stop()
 
-            try:
-                generate_report_from_data(json_data, template_path, output_path)
-                if not os.path.exists(output_path):
-                    st.error("❌ O arquivo DOCX gerado não foi encontrado.")
+                try:
+                    # Rendered in memory: nothing is written to disk or left behind in /tmp
+                    file_bytes = generate_report_from_data(json_data, template_path)
+                    st.info(f"📄 Tamanho do arquivo DOCX gerado: {len(file_bytes)} bytes")
+                except Exception as e:
+                    st.error("❌ Erro ao gerar o relatório:")
+                    st.code(traceback.format_exc())
                     st.stop()
-                file_size = os.path.getsize(output_path)
-                st.info(f"📄 Tamanho do arquivo DOCX gerado: {file_size} bytes")
-                st.info(f"📄 Caminho do arquivo gerado: `{output_path}`")
-            except Exception as e:
-                st.error("❌ Erro ao gerar o relatório:")
-                st.code(traceback.format_exc())
-                st.stop()
 
-            try:
-                with open(output_path, "rb") as f:
-                    file_bytes = f.read()
                 st.info(f"📄 Primeiros bytes do DOCX gerado: {file_bytes[:4]}")
                 if not file_bytes.startswith(b'PK\x03\x04'):
                     st.error("❌ O arquivo gerado não é um DOCX válido (espera-se PK header).")
                     st.stop()
-                st.download_button(
-                    label="📥 Baixar Relatório",
-                    data=file_bytes,
-                    file_name=output_filename,
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                )
-            except Exception as e:
-                st.error("❌ Erro ao baixar o relatório:")
-                st.code(traceback.format_exc())
-    else:
+                st.session_state["generated_reports"].append((language, output_filename, file_bytes))
+    elif not st.session_state.get("generated_reports"):
         st.info("Por favor, preencha todos os campos e faça o upload do PDF.")
 
-def parse_cv_to_json(file_path, report_lang, company_title=None, language_skills=None):
-    client = Client(api_key=os.getenv("OPENAI_API_KEY"))
-    if not file_path:
-        return {"error": "Missing CV file"}
+    # Download buttons are drawn from the session, not inside the button branch: clicking
+    # one reruns the script, and the other language's report must still be there
+    if not batch_mode:
+        for language, output_filename, file_bytes in st.session_state.get("generated_reports", []):
+            st.download_button(
+                label=f"📥 Baixar Relatório ({language})",
+                data=file_bytes,
+                file_name=output_filename,
+                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                key=f"download_{language}"
+            )
 
-    try:
-        with open(file_path, "rb") as f:
-            file_bytes = f.read()
+# --- Extraction cache ---
+# Keyed on the PDF bytes plus everything that shapes the extraction output. It stores the
+# language-neutral record (before translation and form overrides), so regenerating a
+# report with another job title, language skills or report language skips the LLM call.
+
+EXTRACTION_MODEL = "gpt-3.5-turbo"
+# Bump when extraction post-processing changes in a way the prompt hash does not capture
+EXTRACTION_VERSION = "2"
+EXTRACTION_CACHE = TieredCache(
+    "extractions",
+    path=os.path.join(CACHE_FOLDER, "llm_cache.sqlite3") if os.getenv("EXTRACTION_CACHE", "1") != "0" else None,
+    memory_entries=int(os.getenv("EXTRACTION_CACHE_MEMORY_ENTRIES", "64")),
+    disk_entries=int(os.getenv("EXTRACTION_CACHE_DISK_ENTRIES", "5000")),
+    max_age=int(os.getenv("EXTRACTION_CACHE_MAX_AGE", str(30 * 24 * 3600)))
+)
+
+def extraction_cache_key(file_bytes):
+    return make_key(
+        "extraction",
+        hashlib.sha256(file_bytes).hexdigest(),
+        EXTRACTION_MODEL,
+        EXTRACTION_VERSION,
+        PDF_TEXT_MODE,
+        CV_TOKEN_BUDGET,
+        CV_CHUNK_TOKENS if EXTRACTION_CHUNKING else None,
+        hashlib.sha256(extraction_prompt_for_mode().encode("utf-8")).hexdigest(),
+        REQUIRED_SCHEMA
+    )
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(file_bytes)
-            tmp.flush()
-            tmp_pdf_path = tmp.name
+# --- Chunked (map-reduce) extraction ---
+# CVs still over CV_TOKEN_BUDGET after preprocessing are split at section/paragraph
+# boundaries with overlap, extracted chunk by chunk concurrently and merged: companies by
+# normalized name, jobs by title plus dates.
+
+EXTRACTION_CHUNKING = os.getenv("EXTRACTION_CHUNKING", "1") != "0"
+EXTRACTION_CHUNK_CONCURRENCY = int(os.getenv("EXTRACTION_CHUNK_CONCURRENCY", "4"))
+# Stream single-call extractions so finished fields/companies surface before the last token
+EXTRACTION_STREAMING = os.getenv("EXTRACTION_STREAMING", "1") != "0"
+TRANSLATION_PREFETCH_WORKERS = int(os.getenv("TRANSLATION_PREFETCH_WORKERS", "4"))
+# Ask the API for a JSON object response (response_format) instead of free text
+EXTRACTION_JSON_MODE = os.getenv("EXTRACTION_JSON_MODE", "1") != "0"
+
+# --- JSON recovery ---
+# Model output goes through: plain parse -> local repair -> cheap re-ask with only the
+# broken output. The counters show how often each stage was needed.
+
+JSON_RECOVERY_COUNTS = {"parsed": 0, "repaired": 0, "reasked": 0, "failed": 0}
+_json_recovery_lock = threading.Lock()
+
+def count_json_recovery(outcome):
+    with _json_recovery_lock:
+        JSON_RECOVERY_COUNTS[outcome] += 1
+
+# Cache and JSON recovery counters, read when /metrics is scraped
+def pipeline_metrics():
+    caches = {"translation": TRANSLATION_CACHE.stats(), "extraction": EXTRACTION_CACHE.stats()}
+    with _json_recovery_lock:
+        recovery = dict(JSON_RECOVERY_COUNTS)
+    return [
+        ("report_cache_lookups_total", "counter", "LLM cache lookups by result.", [
+            ({"cache": name, "result": result}, stats[key])
+            for name, stats in caches.items()
+            for result, key in (("memory_hit", "memory_hits"), ("disk_hit", "disk_hits"), ("miss", "misses"))
+        ]),
+        ("report_cache_hit_ratio", "gauge", "LLM cache hits over lookups since start.", [
+            ({"cache": name}, stats["hit_rate"]) for name, stats in caches.items()
+        ]),
+        ("report_cache_memory_entries", "gauge", "Entries held in the in-memory cache tier.", [
+            ({"cache": name}, stats["memory_entries"]) for name, stats in caches.items()
+        ]),
+        ("report_json_recovery_total", "counter", "Model JSON outputs by recovery step needed.", [
+            ({"outcome": outcome}, count) for outcome, count in recovery.items()
+        ]),
+    ]
 
-        extracted_text = ""
-        with fitz.open(tmp_pdf_path) as doc:
-            for page in doc:
-                extracted_text += page.get_text()
+REGISTRY.register_collector(pipeline_metrics)
 
-        try:
-            os.remove(tmp_pdf_path)
-        except Exception:
-            pass
-
-        extracted_text = extracted_text.replace("{", "{{").replace("}", "}}")
-        schema_example = json.dumps(REQUIRED_SCHEMA, ensure_ascii=False, indent=2)
-        extraction_prompt = (
-            EXTRACTION_PROMPT
-            + schema_example
-            + "\n\nReport language: " + report_lang
-            + "\nCV Content:\n"
-            + extracted_text
+def json_response_options():
+    return {"response_format": {"type": "json_object"}} if EXTRACTION_JSON_MODE else {}
+
+def reask_for_json(client, broken_output):
+    response = client.chat.completions.create(
+        model=EXTRACTION_MODEL,
+        messages=[
+            {"role": "system", "content": "You fix malformed JSON. Output only the corrected JSON object, with the same content."},
+            {"role": "user", "content": broken_output}
+        ],
+        temperature=0,
+        **json_response_options()
+    )
+    return json.loads(response.choices[0].message.content)
+
+def parse_model_json(json_output, client=None, track=True):
+    try:
+        parsed = json.loads(json_output)
+        outcome = "parsed"
+    except (TypeError, json.JSONDecodeError):
+        parsed = repair_json(json_output)
+        outcome = "repaired"
+        if parsed is None and client is not None and json_output:
+            try:
+                parsed = reask_for_json(client, json_output)
+                outcome = "reasked"
+            except Exception:
+                traceback.print_exc()
+                parsed = None
+    if not isinstance(parsed, dict):
+        parsed, outcome = None, "failed"
+    if track:
+        count_json_recovery(outcome)
+    return parsed, outcome
+
+# Legal forms as token sequences, only ever stripped from the end of a name: "do", "de" or
+# a country inside a name ("Banco do Brasil") are what tells two employers apart
+LEGAL_NAME_SUFFIXES = tuple(tuple(form.split()) for form in (
+    "ltda", "sa", "s a", "me", "epp", "eireli", "inc", "llc", "ltd", "limited", "corp", "corporation",
+    "co", "company", "cia", "gmbh", "plc"
+))
+
+def normalize_merge_key(text):
+    text = unicodedata.normalize("NFKD", text if isinstance(text, str) else "")
+    text = text.encode("ascii", "ignore").decode("ascii").lower()
+    return " ".join(re.findall(r"[a-z0-9]+", text))
+
+def normalize_company_name(name):
+    tokens = normalize_merge_key(name).split()
+    stripped = True
+    while stripped:
+        stripped = False
+        for suffix in LEGAL_NAME_SUFFIXES:
+            if len(tokens) > len(suffix) and tuple(tokens[-len(suffix):]) == suffix:
+                tokens = tokens[:-len(suffix)]
+                stripped = True
+                break
+    return " ".join(tokens)
+
+def fill_empty_fields(target, source):
+    for key, value in source.items():
+        if not isinstance(value, list) and value and not target.get(key):
+            target[key] = value
+
+def merge_tasks(target_tasks, tasks):
+    seen = {normalize_merge_key(t.get("task")) for t in target_tasks}
+    for task in tasks:
+        key = normalize_merge_key(task.get("task"))
+        if key and key not in seen:
+            seen.add(key)
+            target_tasks.append(task)
+
+def merge_line_items(partials):
+    companies = {}
+    for partial in partials:
+        for item in partial["line_items"]:
+            jobs = [j for j in item.get("job_posts", []) if normalize_merge_key(j.get("job_title")) or j.get("start_date")]
+            company_key = normalize_company_name(item.get("cdd_company"))
+            if not company_key and not jobs:
+                continue  # empty schema placeholder
+            company = companies.get(company_key)
+            if company is None:
+                company = {k: v for k, v in item.items() if k != "job_posts"}
+                company["job_posts"] = []
+                company["_jobs"] = {}
+                companies[company_key] = company
+            else:
+                fill_empty_fields(company, item)
+            for job in jobs:
+                job_key = (
+                    normalize_merge_key(job.get("job_title")),
+                    normalize_merge_key(job.get("start_date")),
+                    normalize_merge_key(job.get("end_date"))
+                )
+                existing = company["_jobs"].get(job_key)
+                if existing is None:
+                    company["_jobs"][job_key] = job
+                    company["job_posts"].append(job)
+                else:
+                    fill_empty_fields(existing, job)
+                    merge_tasks(existing.setdefault("job_tasks", []), job.get("job_tasks", []))
+    for company in companies.values():
+        del company["_jobs"]
+    return list(companies.values())
+
+def merge_unique(partials, key, key_fields):
+    merged, seen = [], set()
+    for partial in partials:
+        for entry in partial.get(key, []):
+            entry_key = tuple(normalize_merge_key(entry.get(f)) for f in key_fields)
+            if any(entry_key) and entry_key not in seen:
+                seen.add(entry_key)
+                merged.append(entry)
+    return merged
+
+def merge_extractions(partials):
+    partials = [copy_json_tree(enforce_schema(p, REQUIRED_SCHEMA)) for p in partials]
+    merged = {}
+    for key, default in REQUIRED_SCHEMA.items():
+        if not isinstance(default, list):
+            merged[key] = next((p[key] for p in partials if p.get(key)), default)
+    merged["line_items"] = merge_line_items(partials)
+    merged["academics"] = merge_unique(partials, "academics", ("academic_course", "academic_institution"))
+    merged["languages"] = merge_unique(partials, "languages", ("language",))
+    return merged
+
+def build_extraction_prompt(cv_text, part=None):
+    cv_text = cv_text.replace("{", "{{").replace("}", "}}")
+    extraction_prompt = (
+        extraction_prompt_for_mode()
+        + SCHEMA_EXAMPLE
+        + "\n\nReport language: keep the original language of the CV (values are translated afterwards)"
+    )
+    if part:
+        extraction_prompt += (
+            f"\nThis is part {part[0]} of {part[1]} of a longer CV. Extract only what appears in this part "
+            "and leave every other field empty."
         )
+    return extraction_prompt + "\nCV Content:\n" + cv_text
+
+def parsed_extraction(client, json_output, usage):
+    parsed, outcome = parse_model_json(json_output, client)
+    if parsed is None:
+        return {"error": "Could not parse response as JSON. Original content returned.", "json_result": json_output}, usage, outcome
+    return parsed, usage, outcome
+
+def stream_extraction(client, messages, on_event):
+    parser = IncrementalJSONParser()
+    stream = client.chat.completions.create(
+        model=EXTRACTION_MODEL,
+        messages=messages,
+        temperature=0.3,
+        stream=True,
+        # The last chunk carries token usage (and no choices)
+        stream_options={"include_usage": True},
+        **json_response_options()
+    )
+    usage = None
+    for chunk in stream:
+        if getattr(chunk, "usage", None) is not None:
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            for event in parser.feed(delta):
+                on_event(event)
+    if usage is not None:
+        record_tokens(EXTRACTION_MODEL, usage.prompt_tokens, usage.completion_tokens)
+    return parsed_extraction(client, parser.text, usage)
+
+def request_extraction(client, extraction_prompt, on_event=None):
+    messages = [
+        {"role": "system", "content": "You output JSON for structured candidate analysis. Follow user instructions."},
+        {"role": "user", "content": extraction_prompt}
+    ]
+    if on_event is not None:
+        return stream_extraction(client, messages, on_event)
+    response = client.chat.completions.create(
+        model=EXTRACTION_MODEL,
+        messages=messages,
+        temperature=0.3,
+        **json_response_options()
+    )
+    usage = getattr(response, "usage", None)
+    if not response.choices or not hasattr(response.choices[0], "message"):
+        return {"error": "Unexpected response structure from OpenAI"}, usage, "failed"
+
+    return parsed_extraction(client, response.choices[0].message.content, usage)
+
+@timed("extract_cv_data")
+def extract_cv_data(file_bytes, extraction_stats=None, on_event=None, cv_text=None):
+    client = get_openai_client()
+    # cv_text: PDF text already extracted by the caller (e.g. on the batch process pool)
+    if cv_text is None:
+        with progress.stage("pdf_text"):
+            cv_text = extract_pdf_text(file_bytes, stats=extraction_stats)
+    extracted_text = cv_text
+    extracted_text, preprocess_info = preprocess_cv_text(extracted_text, truncate=not EXTRACTION_CHUNKING)
+
+    if EXTRACTION_CHUNKING and preprocess_info["tokens_after"] > CV_TOKEN_BUDGET:
+        chunks = split_into_chunks(extracted_text)
+        prompts = [build_extraction_prompt(chunk, (i + 1, len(chunks))) for i, chunk in enumerate(chunks)]
+    else:
+        prompts = [build_extraction_prompt(extracted_text)]
 
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You output JSON for structured candidate analysis. Follow user instructions."},
-                {"role": "user", "content": extraction_prompt}
-            ],
-            temperature=0.3
+    with progress.stage("llm_extraction", chunks=len(prompts)):
+        if len(prompts) == 1:
+            results = [request_extraction(client, prompts[0], on_event)]
+        else:
+            with ThreadPoolExecutor(max_workers=min(EXTRACTION_CHUNK_CONCURRENCY, len(prompts))) as pool:
+                # Each chunk runs in a copy of this context, so its OpenAI calls are labelled
+                # with this stage and report to the caller's progress channel
+                futures = [pool.submit(contextvars.copy_context().run, request_extraction, client, prompt) for prompt in prompts]
+                results = [future.result() for future in futures]
+
+    if extraction_stats is not None:
+        extraction_stats.update(preprocess_info)
+        extraction_stats["chunks"] = len(prompts)
+        extraction_stats["prompt_tokens"] = sum(count_tokens(prompt) for prompt in prompts)
+        extraction_stats["json_recovery"] = [outcome for _, _, outcome in results]
+        usages = [usage for _, usage, _ in results if usage is not None]
+        if usages:
+            extraction_stats["usage_prompt_tokens"] = sum(u.prompt_tokens for u in usages)
+            extraction_stats["usage_completion_tokens"] = sum(u.completion_tokens for u in usages)
+    if progress.listening():
+        usages = [usage for _, usage, _ in results if usage is not None]
+        progress.emit(
+            "tokens", stage="llm_extraction",
+            prompt_tokens=sum(u.prompt_tokens for u in usages) if usages else sum(count_tokens(prompt) for prompt in prompts),
+            completion_tokens=sum(u.completion_tokens for u in usages) if usages else None,
+            estimated=not usages
         )
-        if not response.choices or not hasattr(response.choices[0], "message"):
-            return {"error": "Unexpected response structure from OpenAI"}
 
-        json_output = response.choices[0].message.content
+    partials = [parsed for parsed, _, _ in results]
+    for parsed in partials:
+        if "error" in parsed:
+            return parsed
+    if len(partials) == 1:
+        return enforce_schema(partials[0], REQUIRED_SCHEMA)
+    return enforce_schema(merge_extractions(partials), REQUIRED_SCHEMA)
+
+def is_extraction_cached(file_bytes):
+    return EXTRACTION_CACHE.get(extraction_cache_key(file_bytes)) is not None
+
+def extract_cv_record(file_bytes, extraction_stats=None, on_event=None, cv_text=None):
+    cache_key = extraction_cache_key(file_bytes)
+    record = EXTRACTION_CACHE.get(cache_key)
+    progress.emit("cache", cache="extraction", hit=record is not None)
+    if record is None:
+        record = extract_cv_data(file_bytes, extraction_stats, on_event, cv_text)
+        if "error" in record:
+            return record
+        EXTRACTION_CACHE.set(cache_key, record)
+    return copy_json_tree(record)
+
+def localize_record(record, report_lang, company_title=None, language_skills=None, translation_stats=None):
+    validated_data = copy_json_tree(record)
+    validated_data["report_lang"] = report_lang.upper()
+
+    if company_title is not None:
+        validated_data["company_title"] = company_title
+
+    # --- Languages: Only fill from form input (with robust fallback) ---
+    validated_data["languages"] = []
+    LANGUAGES_FORM = [
+        {"pt": "Inglês",   "en": "English",  "key": "english"},
+        {"pt": "Espanhol", "en": "Spanish",  "key": "spanish"},
+        {"pt": "Japonês",  "en": "Japanese", "key": "japanese"},
+    ]
+    report_lang_setting = (validated_data.get("report_lang") or report_lang or "PT").upper()
+    levels = level_table()
+    if language_skills:
+        for lang in LANGUAGES_FORM:
+            lang_key = lang["key"]
+            level = language_skills.get(lang_key, "")
+            if level:
+                language_name = lang["pt"] if report_lang_setting == "PT" else lang["en"]
+                level_description = levels.description_for_id(level, report_lang_setting)
+                validated_data["languages"].append({
+                    "language": language_name,
+                    "language_level": level,
+                    "level_description": level_description
+                })
+
+    # Translate values to English or Portuguese only if report_lang is EN or PT, and skip excluded keys
+    if validated_data.get("report_lang", "PT") == "EN":
+        validated_data = translate_record(validated_data, target_lang="EN", stats=translation_stats)
+    elif validated_data.get("report_lang", "PT") == "PT":
+        validated_data = translate_record(validated_data, target_lang="PT", stats=translation_stats)
+
+    return validated_data
+
+def extract_cv_record_streaming(file_bytes, report_langs, extraction_stats=None, on_event=None, cv_text=None, translation_stats=None):
+    # Fields finished so far are collected and, once line_items closes (the bulk of the
+    # text), translated once per language while academics/languages still stream in. That
+    # warms the translation cache for localize_record at one batch request per language.
+    # Prefetch calls count into translation_stats and run in a copy of this context, so
+    # they keep the job's progress channel and metrics stage.
+    prefetch = ThreadPoolExecutor(max_workers=max(1, min(TRANSLATION_PREFETCH_WORKERS, len(report_langs))))
+    futures = []
+    finished = {}
+
+    def handle_event(event):
+        if event[0] == "field":
+            finished[event[1]] = event[2]
+            if event[1] == "line_items" and isinstance(event[2], list):
+                for lang in report_langs:
+                    futures.append(prefetch.submit(
+                        contextvars.copy_context().run, prefetch_translation, dict(finished), lang, translation_stats
+                    ))
+        if on_event is not None:
+            on_event(event)
 
-        try:
-            parsed_data = json.loads(json_output)
-            validated_data = enforce_schema(parsed_data, REQUIRED_SCHEMA)
-        except json.JSONDecodeError:
-            return {"error": "Could not parse response as JSON. Original content returned.", "json_result": json_output}
-
-        if company_title is not None:
-            validated_data["company_title"] = company_title
-
-        # --- Languages: Only fill from form input (with robust fallback) ---
-        validated_data["languages"] = []
-        LANGUAGES_FORM = [
-            {"pt": "Inglês",   "en": "English",  "key": "english"},
-            {"pt": "Espanhol", "en": "Spanish",  "key": "spanish"},
-            {"pt": "Japonês",  "en": "Japanese", "key": "japanese"},
-        ]
-        report_lang_setting = (validated_data.get("report_lang") or report_lang or "PT").upper()
-        if language_skills:
-            for lang in LANGUAGES_FORM:
-                lang_key = lang["key"]
-                level = language_skills.get(lang_key, "")
-                if level:
-                    language_name = lang["pt"] if report_lang_setting == "PT" else lang["en"]
-                    row = df_levels[df_levels["language_level"] == level]
-                    level_description = (
-                        row.iloc[0]["level_description_pt"] if (not row.empty and report_lang_setting == "PT")
-                        else row.iloc[0]["level_description_en"] if (not row.empty and report_lang_setting == "EN")
-                        else ""
-                    )
-                    validated_data["languages"].append({
-                        "language": language_name,
-                        "language_level": level,
-                        "level_description": level_description
-                    })
-
-        # Translate values to English or Portuguese only if report_lang is EN or PT, and skip excluded keys
-        if validated_data.get("report_lang", "PT") == "EN":
-            validated_data = translate_json_values(validated_data, target_lang="EN")
-        elif validated_data.get("report_lang", "PT") == "PT":
-            validated_data = translate_json_values(validated_data, target_lang="PT")
-
-        return validated_data
+    try:
+        return extract_cv_record(file_bytes, extraction_stats, handle_event, cv_text)
+    finally:
+        wait(futures)
+        prefetch.shutdown()
+
+def prefetch_translation(partial_record, lang, stats):
+    with progress.stage("prefetch_translation", lang=lang.upper()):
+        translate_record(partial_record, lang, stats=stats)
+
+@timed("parse_cv_bytes_multi")
+def parse_cv_bytes_multi(file_bytes, report_langs, company_title=None, language_skills=None, translation_stats=None, extraction_stats=None, on_event=None, cv_text=None):
+    # One PDF parse and one extraction call shared by every report language
+    if not file_bytes:
+        return {"error": "Missing CV file"}
+
+    try:
+        with progress.stage("extract"):
+            if EXTRACTION_STREAMING:
+                record = extract_cv_record_streaming(file_bytes, report_langs, extraction_stats, on_event, cv_text, translation_stats)
+            else:
+                record = extract_cv_record(file_bytes, extraction_stats, cv_text=cv_text)
+        if "error" in record:
+            return record
+
+        results = {}
+        for lang in report_langs:
+            with progress.stage("localize", lang=lang.upper()):
+                results[lang.upper()] = localize_record(record, lang, company_title, language_skills, translation_stats)
+        return results
 
     except Exception as e:
         traceback.print_exc()
         return {"error": str(e)}
 
-def build_context(data):
-    line_items = []
-    latest_date = None
-    last_company = ""
-    report_lang = data.get("report_lang", "PT")
-
-    for item in data.get("line_items", []):
-        item["cdd_company"] = format_caps(item.get("cdd_company", ""))
-        raw_desc = item.get("company_desc", "")
-        item["company_desc"] = trim_text(format_first(raw_desc), 89)
-        job_posts = []
-        start_dates = []
-        end_dates = []
-        any_present = False
-
-        for job in item.get("job_posts", []):
-            job["job_title"] = smart_title(job.get("job_title", ""))
-
-            raw_start = job.get("start_date", "")
-            norm_start = normalize_to_mm_yyyy(raw_start, report_lang)
-            if valid_mm_yyyy(norm_start):
-                start_val = norm_start
-                start_dt = parse_mm_yyyy(norm_start)
-            else:
-                start_val = "00/0000"
-                start_dt = None
-            job["start_date"] = start_val
-            if start_val != "00/0000" and start_dt:
-                start_dates.append(start_dt)
-
-            raw_end = job.get("end_date", "")
-            norm_end = normalize_to_mm_yyyy(raw_end, report_lang)
-            if is_present_term(norm_end, report_lang):
-                end_val = "PRESENT"
-                any_present = True
-                end_dt = None
-            elif valid_mm_yyyy(norm_end):
-                end_val = norm_end
-                end_dt = parse_mm_yyyy(norm_end)
-                if end_dt:
-                    end_dates.append(end_dt)
-            else:
-                end_val = "00/0000"
-                end_dt = None
-            job["end_date"] = end_val
-
-            if end_val == "PRESENT":
-                any_present = True
-            elif end_val != "00/0000" and end_dt:
-                end_dates.append(end_dt)
-
-            for task in job.get("job_tasks", []):
-                task["task"] = format_first(task.get("task", ""))
+def parse_cv_bytes(file_bytes, report_lang, company_title=None, language_skills=None, translation_stats=None):
+    result = parse_cv_bytes_multi(file_bytes, [report_lang], company_title, language_skills, translation_stats)
+    if "error" in result:
+        return result
+    return result[report_lang.upper()]
 
-            job_posts.append(job)
+def read_cv_file(file_path):
+    with open(file_path, "rb") as f:
+        return f.read()
 
-        if start_dates:
-            item["company_start_date"] = min(start_dates).strftime("%m/%Y")
-        else:
-            item["company_start_date"] = "00/0000"
+def parse_cv_to_json_multi(file_path, report_langs, company_title=None, language_skills=None, translation_stats=None):
+    if not file_path:
+        return {"error": "Missing CV file"}
+    try:
+        file_bytes = read_cv_file(file_path)
+    except Exception as e:
+        traceback.print_exc()
+        return {"error": str(e)}
+    return parse_cv_bytes_multi(file_bytes, report_langs, company_title, language_skills, translation_stats)
 
-        if any_present:
-            item["company_end_date"] = "PRESENT"
-        elif end_dates:
-            item["company_end_date"] = max(end_dates).strftime("%m/%Y")
-        else:
-            item["company_end_date"] = "00/0000"
-
-        item["job_count"] = len(job_posts)
-        item["job_posts"] = job_posts
-        line_items.append(item)
-
-    for acad in data.get("academics", []):
-        acad["academic_course"] = smart_title(acad.get("academic_course", ""))
-        acad["academic_institution"] = smart_title(acad.get("academic_institution", ""))
-
-    for lang in data.get("languages", []):
-        lang_report_lang = data.get("report_lang", "PT")
-        canonical_level = canonicalize_language_level(lang.get("language_level", ""), lang_report_lang)
-        if canonical_level:
-            lang["language_level"] = canonical_level
-        level_entry = find_level_entry(lang.get("language_level"), lang_report_lang)
-        if level_entry:
-            lang["level_description"] = level_entry["level_description"]
-            lang["language_level"] = level_entry["language_level"]
-        else:
-            lang["level_description"] = ""
-        lang["language"] = smart_title(lang.get("language", ""))
-
-    def end_cmp(end_str):
-        if end_str == "PRESENT":
-            return (2, None)
-        elif valid_mm_yyyy(end_str):
-            return (1, parse_mm_yyyy(end_str))
-        else:
-            return (0, None)
+@timed("parse_cv_to_json")
+def parse_cv_to_json(file_path, report_lang, company_title=None, language_skills=None, translation_stats=None):
+    if not file_path:
+        return {"error": "Missing CV file"}
+    try:
+        file_bytes = read_cv_file(file_path)
+    except Exception as e:
+        traceback.print_exc()
+        return {"error": str(e)}
+    return parse_cv_bytes(file_bytes, report_lang, company_title, language_skills, translation_stats)
+
+# Company end dates rank by month ordinal; a current job outranks any date
+PRESENT_RANK = 10 ** 6
+UNDATED_RANK = -1
+
+def build_job_context(job, report_lang):
+    # Each date is parsed once; comparisons use integer month ordinals
+    raw_start, raw_end = split_job_dates(job.get("start_date", ""), job.get("end_date", ""))
+    start_ym = parse_month_year(raw_start)
+    end_ym = parse_month_year(raw_end)
+    start = month_ordinal(start_ym) if start_ym else None
+    if end_ym:
+        end = month_ordinal(end_ym)
+        end_date = format_month_ordinal(end)
+    elif is_present_term_any(raw_end, report_lang):
+        end = PRESENT_RANK
+        end_date = "PRESENT"
+    else:
+        end = None
+        end_date = "00/0000"
+    context = MappingProxyType({
+        **job,
+        "job_title": smart_title(job.get("job_title", "")),
+        "start_date": format_month_ordinal(start),
+        "end_date": end_date,
+        "job_tasks": tuple(
+            MappingProxyType({**task, "task": format_first(task.get("task", ""))})
+            for task in job.get("job_tasks", [])
+        )
+    })
+    return context, start, end
+
+def build_line_item_context(item, report_lang):
+    job_posts = []
+    company_start = None
+    company_end = None
+    for job in item.get("job_posts", []):
+        job_context, start, end = build_job_context(job, report_lang)
+        job_posts.append(job_context)
+        if start is not None and (company_start is None or start < company_start):
+            company_start = start
+        if end is not None and (company_end is None or end > company_end):
+            company_end = end
+
+    if company_end == PRESENT_RANK:
+        company_end_date = "PRESENT"
+    else:
+        company_end_date = format_month_ordinal(company_end)
+    context = MappingProxyType({
+        **item,
+        "cdd_company": format_caps(item.get("cdd_company", "")),
+        "company_desc": trim_text(format_first(item.get("company_desc", "")), 89),
+        "company_start_date": format_month_ordinal(company_start),
+        "company_end_date": company_end_date,
+        "job_count": len(job_posts),
+        "job_posts": tuple(job_posts)
+    })
+    return context, UNDATED_RANK if company_end is None else company_end
+
+def build_language_context(lang, report_lang):
+    level = lang.get("language_level", "")
+    canonical_level = canonicalize_language_level(level, report_lang)
+    if canonical_level:
+        level = canonical_level
+    level_entry = find_level_entry(level, report_lang)
+    return MappingProxyType({
+        **lang,
+        "language_level": level_entry["language_level"] if level_entry else level,
+        "level_description": level_entry["level_description"] if level_entry else "",
+        "language": smart_title(lang.get("language", ""))
+    })
+
+# Builds a new read-only context and leaves the record untouched, so one extracted record
+# can be rendered any number of times (several client companies, retries) without copies
+@timed("build_context")
+def build_context(data):
+    report_lang = data.get("report_lang", "PT")
 
-    for item in line_items:
-        end_str = item.get("company_end_date", "")
-        if latest_date is None or end_cmp(end_str) > end_cmp(latest_date):
-            latest_date = end_str
-            last_company = item.get("cdd_company", "")
+    line_items = []
+    latest_rank = None
+    last_company = ""
+    for item in data.get("line_items", []):
+        item_context, end_rank = build_line_item_context(item, report_lang)
+        line_items.append(item_context)
+        if latest_rank is None or end_rank > latest_rank:
+            latest_rank = end_rank
+            last_company = item_context["cdd_company"]
+
+    academics = tuple(
+        MappingProxyType({
+            **acad,
+            "academic_course": smart_title(acad.get("academic_course", "")),
+            "academic_institution": smart_title(acad.get("academic_institution", ""))
+        })
+        for acad in data.get("academics", [])
+    )
+    languages = tuple(build_language_context(lang, report_lang) for lang in data.get("languages", []))
 
     context = {
         "company": format_caps(data.get("company", "")),
@@ -781,24 +1586,61 @@ def build_context(data):
         "job_pension": data.get("job_pension", ""),
         "job_others": data.get("job_others", ""),
         "job_expectation": data.get("job_expectation", ""),
-        "line_items": line_items,
-        "academics": data.get("academics", []),
-        "languages": data.get("languages", []),
+        "line_items": tuple(line_items),
+        "academics": academics,
+        "languages": languages,
         "last_company": last_company,
-        "report_lang": data.get("report_lang", "PT"),
-        "report_date": format_report_date(data.get("report_lang", "PT"))
+        "report_lang": report_lang,
+        "report_date": format_report_date(report_lang)
     }
-    return context
-
-def generate_report_from_data(data, template_path, output_path):
-    context = build_context(data)
-    try:
-        doc = DocxTemplate(template_path)
-        doc.render(context)
-        doc.save(output_path)
-    except Exception as e:
-        traceback.print_exc()
-        raise e
+    return MappingProxyType(context)
+
+def template_path_for(language):
+    return os.path.join(TEMPLATE_FOLDER, f"Template_Placeholders_{language}.docx")
+
+def report_filename(data, language, with_language_suffix=False):
+    safe_name = (data.get("cdd_name") or "candidato").lower().replace(" ", "_")
+    lang_suffix = f"_{language}" if with_language_suffix else ""
+    return f"Relatorio_{safe_name}_{datetime.today().strftime('%Y%m%d')}{lang_suffix}.docx"
+
+# Returns the DOCX bytes; output_path is only for callers that still want a file
+@timed("generate_report_from_data")
+def generate_report_from_data(data, template_path, output_path=None):
+    buffer = io.BytesIO()
+    with progress.stage("render", lang=data.get("report_lang")):
+        context = build_context(data)
+        try:
+            doc = TEMPLATE_REGISTRY.new_document(template_path)
+            doc.render(context)
+            doc.save(buffer)
+        except Exception as e:
+            traceback.print_exc()
+            raise e
+    report = buffer.getvalue()
+    if output_path:
+        with open(output_path, "wb") as f:
+            f.write(report)
+    return report
+
+# --- Whole pipeline for one CV (batch and API jobs) ---
+# settings: report_langs, company, company_title, language_skills
+
+def generate_reports(file_bytes, settings, extraction_stats=None, translation_stats=None, cv_text=None):
+    report_langs = [lang.upper() for lang in settings["report_langs"]]
+    results = parse_cv_bytes_multi(
+        file_bytes, report_langs, company_title=settings.get("company_title"),
+        language_skills=settings.get("language_skills"), translation_stats=translation_stats,
+        extraction_stats=extraction_stats, cv_text=cv_text
+    )
+    if "error" in results:
+        return results
+    reports = []
+    for language in report_langs:
+        data = results[language]
+        data["company"] = settings.get("company", "")
+        report = generate_report_from_data(data, template_path_for(language))
+        reports.append((language, report_filename(data, language, len(report_langs) > 1), report))
+    return {"results": results, "reports": reports}
 
 if __name__ == "__main__":
     run_streamlit()